@@ -0,0 +1,160 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Reproducible benchmarks of the statistics, distribution functions, quantiles, sampling and a small simulation.
+
+Run from the source directory:
+    python -m benchmarks.benchmark_suite --save         # measure and store the baseline
+    python -m benchmarks.benchmark_suite                # measure and compare with the baseline
+    python -m benchmarks.benchmark_suite --filter cdf   # only the benchmarks containing "cdf"
+The exit code is 1 iff a benchmark is slower than the baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+# local file imports
+from statistical_tests.ks_test import KsTest
+from statistical_tests.ks_test_onesided import KsTestOneSided
+from statistical_tests.ln_test import LnTest
+from statistical_tests.ln_test_onesided import LnTestOneSided
+from statistical_tests.vn_test import VnTest
+from statistical_tests.vn_test_onesided import VnTestOneSided
+from simulation.statistic_tools import get_cdf_uniform_with_eps_error, get_random_values
+from simulation.monte_carlo import MonteCarloSimulation
+
+TEST_CLASSES = [KsTest, KsTestOneSided, LnTest, LnTestOneSided, VnTest, VnTestOneSided]
+BASELINE_FILENAME = os.path.join('benchmarks', 'baseline.json')
+
+
+def get_benchmarks() -> List[Tuple[str, Callable[[], Callable[[], object]]]]:
+    """Returns pairs of a name and a setup function. The setup is not measured and returns the measured function."""
+    benchmarks = []
+
+    for test_class in TEST_CLASSES:
+        for n in [10, 100, 1000, 10 ** 5]:
+            def setup(test_class=test_class, n=n) -> Callable[[], object]:
+                test = test_class()
+                data = np.random.RandomState(0).uniform(size=n)
+
+                def run() -> None:
+                    test.data = data
+                    test.get_statistic()
+                return run
+            benchmarks.append(("statistic/" + test_class.__name__ + "/n=" + str(n), setup))
+
+    for test_class in [KsTest, LnTest, KsTestOneSided, LnTestOneSided]:
+        for max_iter in [10, 100, 1000]:
+            def setup(test_class=test_class, max_iter=max_iter) -> Callable[[], object]:
+                cdf = test_class().get_cdf(max_iter)
+                points = np.linspace(0.05, 3.0, 100)
+                return lambda: [cdf(x) for x in points]
+            benchmarks.append(("cdf/" + test_class.__name__ + "/max_iter=" + str(max_iter), setup))
+
+        def setup_cold(test_class=test_class) -> Callable[[], object]:
+            test = test_class()
+
+            def run() -> None:
+                test._quantile_table.quantiles = []  # forget all quantiles of this instance only
+                test.get_quantile(0.9, epsilon=0.0001, max_iter=100, save=False)  # never touch the shipped tables
+            return run
+
+        def setup_warm(test_class=test_class) -> Callable[[], object]:
+            test = test_class()
+            test.get_quantile(0.9, epsilon=0.0001, max_iter=100, save=False)
+            return lambda: test.get_quantile(0.9, epsilon=0.0001, max_iter=100, save=False)
+
+        benchmarks.append(("quantile_cold/" + test_class.__name__, setup_cold))
+        benchmarks.append(("quantile_warm/" + test_class.__name__, setup_warm))
+
+    for n in [100, 10 ** 4]:
+        def setup(n=n) -> Callable[[], object]:
+            cdf = get_cdf_uniform_with_eps_error(epsilon=0.05, error_position=0.5, delta=0.1)
+            return lambda: get_random_values(cdf, size=n)
+        benchmarks.append(("random_values/n=" + str(n), setup))
+
+    def setup_simulation() -> Callable[[], object]:
+        import matplotlib
+        matplotlib.use('Agg')  # never open a window
+        simulation = MonteCarloSimulation(number_of_vectors=20, length_of_vector=50, alpha=0.1)
+        for test_class in [KsTest, LnTest, VnTest]:
+            simulation.add_test(test_class())
+        return lambda: simulation.plot_quality_function(epsilon_max=0.05, resolution=20, error_position=0.5,
+                                                        error_delta=0.1, print_benchmarks=False, show_plot=False)
+    benchmarks.append(("quality_function/m=20/n=50/resolution=20", setup_simulation))
+    return benchmarks
+
+
+def measure(function: Callable[[], object], repetitions: int, min_duration: float = 0.2) -> float:
+    """Returns the fastest mean duration in seconds of several rounds. Each round calls the function as often
+    as needed to take at least min_duration seconds, so short functions are not dominated by timer noise."""
+    function()  # warm-up, e.g. numba compilation and caches
+    start_time = time.perf_counter()
+    function()
+    calls = max(1, int(min_duration / max(time.perf_counter() - start_time, 1e-9)))
+
+    durations = []
+    for i in range(repetitions):
+        start_time = time.perf_counter()
+        for j in range(calls):
+            function()
+        durations.append((time.perf_counter() - start_time) / calls)
+    return min(durations)
+
+
+def run_benchmarks(name_filter: str = '', repetitions: int = 3, printing: bool = True) -> Dict[str, float]:
+    results = {}
+    for name, setup in get_benchmarks():
+        if name_filter in name:
+            results[name] = measure(setup(), repetitions)
+            if printing:
+                print(name + ": " + format(results[name], '.3e') + " s")
+    return results
+
+
+def find_regressions(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Returns the names of all benchmarks which are slower than (1 + threshold) times their baseline."""
+    return [name for name, duration in results.items()
+            if name in baseline and duration > (1 + threshold) * baseline[name]]
+
+
+def main(arguments: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the statistical tests and the simulation.")
+    parser.add_argument('--save', action='store_true', help="store the results as new baseline")
+    parser.add_argument('--baseline', default=BASELINE_FILENAME, help="JSON file of the baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative slowdown, e.g. 0.2 = 20%%")
+    parser.add_argument('--filter', default='', help="run only benchmarks whose name contains this string")
+    parser.add_argument('--repetitions', type=int, default=3)
+    args = parser.parse_args(arguments)
+
+    results = run_benchmarks(args.filter, args.repetitions)
+
+    if args.save:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print("Baseline saved in " + args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("There is no baseline. Run with --save first.")
+        return 0
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name in regressions:
+        print("Regression: " + name + " took " + format(results[name], '.3e') + " s instead of "
+              + format(baseline[name], '.3e') + " s")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
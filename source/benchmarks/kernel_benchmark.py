@@ -0,0 +1,68 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Compares the numba and the NumPy backend of statistical_tests.kernels.
+Run from the source directory with: python -m benchmarks.kernel_benchmark"""
+
+import time
+from typing import Callable
+import numpy as np
+
+# local file imports
+from statistical_tests import kernels
+from statistical_tests.sorted_sample import SortedSample
+from statistical_tests.ks_test import KsTest
+from statistical_tests.ks_test_onesided import KsTestOneSided
+from statistical_tests.ln_test import LnTest
+from statistical_tests.ln_test_onesided import LnTestOneSided
+from statistical_tests.vn_test import VnTest
+from statistical_tests.vn_test_onesided import VnTestOneSided
+
+TEST_CLASSES = [KsTest, KsTestOneSided, LnTest, LnTestOneSided, VnTest, VnTestOneSided]
+
+
+def measure(function: Callable[[], object], repetitions: int = 5) -> float:
+    """Returns the fastest of several runs in seconds. The first call is not measured (compilation)."""
+    function()
+    durations = []
+    for i in range(repetitions):
+        start_time = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def compare_backends(function: Callable[[], object]) -> str:
+    durations = {}
+    for backend in kernels.BACKENDS:
+        kernels.set_backend(backend)
+        durations[backend] = measure(function)
+    return ("numpy: " + format(durations['numpy'], '.6f') + " s, numba: " + format(durations['numba'], '.6f')
+            + " s, speedup: " + format(durations['numpy'] / durations['numba'], '.1f'))
+
+
+def benchmark_statistics(number_of_vectors: int = 100) -> None:
+    for n in [10, 100, 1000, 10 ** 4]:
+        data = np.sort(np.random.uniform(size=(number_of_vectors, n)), axis=1)
+        for test_class in TEST_CLASSES:
+            test = test_class()
+
+            def evaluate() -> None:
+                test.sample = SortedSample(data)
+                test.get_statistic()
+
+            print(test.get_name() + ", n=" + str(n) + ", " + str(number_of_vectors) + " vectors: "
+                  + compare_backends(evaluate))
+
+
+def benchmark_cdfs(number_of_points: int = 1000) -> None:
+    x = np.linspace(0.01, 3.0, number_of_points)
+    for max_iter in [100, 1000]:
+        print("Kolmogorov Smirnov cdf, max_iter=" + str(max_iter) + ": "
+              + compare_backends(lambda: kernels.ks_cdf(x, max_iter)))
+        print("Ln cdf, max_iter=" + str(max_iter) + ": " + compare_backends(lambda: kernels.ln_cdf(x, max_iter)))
+
+
+if __name__ == "__main__":
+    if not kernels.NUMBA_AVAILABLE:
+        raise SystemExit("numba is not installed, so there is nothing to compare")
+    benchmark_statistics()
+    benchmark_cdfs()
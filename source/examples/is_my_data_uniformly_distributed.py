@@ -16,3 +16,9 @@ ks_test.do_test(alpha=significance_level)
 ln_test = LnTest(data_vector=my_data)
 ln_test.do_test(alpha=significance_level)
 
+
+# large data sets should not be written as Python lists: load them from a file instead.
+# .npy and raw binary files (.f64, .f32) are memory-mapped, text files (.csv, .txt) are read chunk by chunk.
+# sort_in_place=True avoids a second, sorted copy of the data.
+# ks_test = KsTest.from_file("my_data.npy", sort_in_place=True)
+# ks_test = KsTest.from_file("my_data.csv", column=1, separator=';', skip_header=1)
@@ -31,15 +31,12 @@ def plot_data(
     x_axis_grid = np.linspace(0., 1., len(list_of_data[0]))  # grid with equal distance in [0,1]
 
     for i, data in enumerate(list_of_data):
-        emp_dist_func = ecdf(data)(x_axis_grid)
-        uni_emp_proc = uep(np.array(data))(x_axis_grid)
-
         if plot_scatter:
             ax_scatter.scatter(x_axis_grid, data, s=2)  # s = Size of each point
         if plot_ecdf:
-            ax_ecdf.plot(x_axis_grid, emp_dist_func, linewidth=1, label='F_n(x), ' + str(i + 1))
+            ax_ecdf.plot(*ecdf(data).get_breakpoints(), linewidth=1, label='F_n(x), ' + str(i + 1))  # exact steps
         if plot_uep:
-            ax_uep.plot(x_axis_grid, uni_emp_proc, linewidth=1, label='U_n(x), ' + str(i + 1))
+            ax_uep.plot(*uep(data).get_breakpoints(), linewidth=1, label='U_n(x), ' + str(i + 1))
 
     # actual plotting: all in one
     if plot_uep:
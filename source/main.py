@@ -1,4 +1,7 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
+import argparse
+import cProfile
+import pstats
 import time
 
 # lokale Importe
@@ -7,6 +10,8 @@ from statistical_tests.vn_test import VnTest
 from statistical_tests.ks_test import KsTest
 from simulation.statistic_tools import get_cdf_uniform_with_eps_error
 from simulation.monte_carlo import MonteCarloSimulation
+from simulation.instrumentation import instrumentation
+from simulation.progress import ProgressReporter
 
 # Parameter der Monte-Carlo-Simulation
 ####################################
@@ -19,6 +24,19 @@ delta = 0.11            # Breite der Störung der Verteilungsfunktion
 aufloesung = 30         # Anzahl der Werte zwischen 0 und epsilon_max, mit welchen die Verteilungsfunktion gestört wird
 #####################################
 
+# Optionen für die Laufzeitanalyse, z.B. "main.py --profile" oder "main.py --zeitmessung --trace trace.json"
+parser = argparse.ArgumentParser(description="Monte-Carlo-Simulation zum Vergleich der Gütefunktionen")
+parser.add_argument('--profile', nargs='?', const='main.prof', metavar='DATEI',
+                    help="führt die Simulation mit cProfile aus und speichert die Statistik (Standard: main.prof)")
+parser.add_argument('--zeitmessung', action='store_true',
+                    help="misst die Zeit der einzelnen Schritte der Simulation und gibt eine Zusammenfassung aus")
+parser.add_argument('--json', metavar='DATEI', help="speichert die Zeitmessung als JSON-Datei")
+parser.add_argument('--trace', metavar='DATEI', help="speichert die Zeitmessung im Chrome-Trace-Format")
+args = parser.parse_args()
+
+if args.zeitmessung or args.json or args.trace:
+    instrumentation.enable(trace=args.trace is not None)
+
 mon = MonteCarloSimulation(number_of_vectors=m, length_of_vector=n, alpha=alpha)
 
 mon.add_test(KsTest(color='r'))
@@ -32,5 +50,19 @@ cdf.plot(title="Epsilon=" + str(epsilon_max) + "; Fehlerposition=" + str(fehlerp
 
 print("Das kann jetzt eine Weile dauern ... bitte warten...")
 start_time = time.time()
-mon.plot_quality_function(epsilon_max=epsilon_max, error_delta=delta, error_position=fehlerposition, resolution=aufloesung, print_benchmarks=False)
+simulation_arguments = dict(epsilon_max=epsilon_max, error_delta=delta, error_position=fehlerposition,
+                            resolution=aufloesung, print_benchmarks=False, progress=ProgressReporter())
+if args.profile:
+    profiler = cProfile.Profile()
+    profiler.runcall(mon.plot_quality_function, **simulation_arguments)
+    profiler.dump_stats(args.profile)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    print("Die Profiling-Statistik wurde in " + args.profile + " gespeichert.")
+else:
+    mon.plot_quality_function(**simulation_arguments)
 print("Fertig nach " + str((time.time() - start_time)/60) + " Minuten.")
+
+if args.json:
+    instrumentation.save_json(args.json)
+if args.trace:
+    instrumentation.save_chrome_trace(args.trace)
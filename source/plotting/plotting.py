@@ -30,7 +30,8 @@ def plot(functions_to_plot: List[FunctionToPlot],
          save_png: bool = False,
          save_pickle: bool = False,
          filename_without_extension: str = None,
-         show_plot: bool = None
+         show_plot: bool = None,
+         x_values: List[float] = None
          ) -> None:
     """ Plots all functions in the functions_to_plot list.
 
@@ -41,6 +42,8 @@ def plot(functions_to_plot: List[FunctionToPlot],
         x_max (float): The upper bound of the plot.
         resolution (int): The number of points that will be plotted.
             Each function in functions_to_plot will be that often evaluated.
+            Functions with a method get_breakpoints(x_min, x_max), e.g. empirical distribution functions,
+            are plotted exactly through their breakpoints instead.
         title (str): The title of the plot.
         print_benchmarks (bool): Prints duration of the function evaluations.
         save_png (bool): saves the plot as png file iff True
@@ -48,31 +51,37 @@ def plot(functions_to_plot: List[FunctionToPlot],
             The plot can be loaded and viewed later with full matplotlib functionality.
         filename_without_extension (str): The filename used when the file is saved.
         show_plot (bool): Shows plot iff True. Its True by default iff the plot is not saved.
+        x_values (list): The points at which the functions are evaluated, e.g. a non-uniform grid.
+            Replaces the resolution evenly spaced points iff given.
 
     Example:
         >>> f2p = FunctionToPlot(lambda x: x * x, label="Square", color='r')
         >>> plot([f2p], x_min=-1, x_max=1)
     """
 
-    if x_min >= x_max or functions_to_plot == [] or resolution < 20:
+    if x_min >= x_max or functions_to_plot == [] or (x_values is None and resolution < 20):
         raise ValueError("invalid input arguments")
 
-    x_axis = np.linspace(start=x_min, stop=x_max, num=resolution)
+    x_axis = np.linspace(start=x_min, stop=x_max, num=resolution) if x_values is None else x_values
     figure = plt.figure()
 
     for p in functions_to_plot:
-        y_axis = []
         start_time = time.time()
-        for x in x_axis:
-            y_axis.append(p.func(x))
+        if hasattr(p.func, 'get_breakpoints'):  # e.g. an empirical distribution function: plot the exact graph
+            x_points, y_axis = p.func.get_breakpoints(x_min, x_max)
+        else:
+            x_points = x_axis
+            y_axis = []
+            for x in x_axis:
+                y_axis.append(p.func(x))
 
         if print_benchmarks:
             print(
-                "Benchmark: " + str(resolution) + " evaluations of function "
+                "Benchmark: " + str(len(x_points)) + " evaluations of function "
                 + p.label + " took " + str(time.time() - start_time) + " seconds."
                 )
 
-        plt.plot(x_axis, y_axis, color=p.color, label=p.label)
+        plt.plot(x_points, y_axis, color=p.color, label=p.label)
 
     plt.title(title)
     plt.xlabel('x')
@@ -0,0 +1,278 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""A long-running local server which tests data for uniform distribution.
+
+The quantile tables, critical values and null distributions stay in memory of the worker processes, so only the
+first request for a new n or alpha is slow. Requests are answered concurrently by an asyncio HTTP server. Requests
+with the same tests and alphas, which arrive within batch_delay seconds, are evaluated together by
+evaluate_datasets in a worker process, which stacks data sets of the same length into one vectorized evaluation.
+
+Run from the source directory:
+    python -m server.uniformity_server --port 8765
+    python -m server.uniformity_server --unix /tmp/uniformity.sock
+
+Protocol:
+    GET /health
+    POST /test?tests=KsTest,VnTest&alpha=0.05,0.1&p_values=1&dtype=float64
+        The body contains the data as raw little-endian floats (dtype float64 or float32).
+        The answer is JSON: {"results": [{"test": ..., "alpha": ..., "n": ..., "statistic": ..., "critical_value": ...,
+        "p_value": ..., "dismissed": ...}, ...]} with one entry for each test and alpha.
+        Invalid requests are answered with 400 and unexpected errors with 500, both with {"error": ...}.
+
+Example:
+    >>> request_evaluation(np.random.uniform(size=100), tests=['KsTest', 'LnTest'], alphas=[0.05], port=8765)
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+import numpy as np
+
+# local file imports
+from statistical_tests.batch_testing import evaluate_datasets
+from statistical_tests.ks_test import KsTest
+from statistical_tests.ks_test_onesided import KsTestOneSided
+from statistical_tests.ln_test import LnTest
+from statistical_tests.ln_test_onesided import LnTestOneSided
+from statistical_tests.vn_test import VnTest
+from statistical_tests.vn_test_onesided import VnTestOneSided
+
+TEST_CLASSES = {test_class.__name__: test_class
+                for test_class in [KsTest, KsTestOneSided, LnTest, LnTestOneSided, VnTest, VnTestOneSided]}
+DTYPES = {'float64': np.dtype('<f8'), 'float32': np.dtype('<f4')}
+NUMBER_OF_SAMPLES = 10 ** 4  # of the simulated null distributions for p-values
+
+BatchKey = Tuple[Tuple[str, ...], Tuple[float, ...], bool]  # test names, alphas, with p-values
+
+_tests = {}  # the test objects of a worker process, which keep their quantile tables in memory
+
+
+def _initialize_worker() -> None:
+    """Loads the quantile tables once per worker process."""
+    for name, test_class in TEST_CLASSES.items():
+        _tests[name] = test_class()
+
+
+def _evaluate(key: BatchKey, datasets: List[np.array]) -> np.ndarray:
+    """Runs in a worker process."""
+    test_names, alphas, with_p_values = key
+    if not _tests:
+        _initialize_worker()
+    return evaluate_datasets(datasets, [_tests[name] for name in test_names], list(alphas),
+                             with_p_values=with_p_values, number_of_samples=NUMBER_OF_SAMPLES)
+
+
+class MicroBatcher:
+    """Collects the data sets of concurrent requests with the same key and evaluates them together,
+    as soon as max_batch_size data sets are waiting or the first one waited batch_delay seconds."""
+    def __init__(self, executor, batch_delay: float = 0.005, max_batch_size: int = 256):
+        self.executor = executor
+        self.batch_delay = batch_delay
+        self.max_batch_size = max_batch_size
+        self._pending = {}  # key -> list of (data, future)
+
+    async def submit(self, key: BatchKey, data: np.array) -> np.ndarray:
+        """Returns the rows of evaluate_datasets for the given data."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((data, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            loop.call_later(self.batch_delay, self._flush, key, batch)
+        return await future
+
+    def _flush(self, key: BatchKey, batch: list = None) -> None:
+        if batch is not None and self._pending.get(key) is not batch:
+            return  # this batch was already flushed because it was full
+        batch = self._pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key: BatchKey, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, _evaluate, key, [data for data, future in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # evaluate each data set on its own, so only the requests with invalid data fail
+                await asyncio.gather(*[self._run(key, [entry]) for entry in batch])
+                return
+            for data, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for i, (data, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(result[result['dataset'] == i])
+
+
+class UniformityServer:
+    """An HTTP server on host:port, or on a Unix socket iff unix_path is given. Use port 0 for a free port.
+    processes is the number of worker processes, all cores iff None."""
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 8765,
+                 unix_path: str = None,
+                 processes: int = None,
+                 batch_delay: float = 0.005,
+                 max_batch_size: int = 256):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.processes = processes
+        self.batch_delay = batch_delay
+        self.max_batch_size = max_batch_size
+        self._executor = None
+        self._batcher = None
+        self._server = None
+        self._connections = set()  # the tasks of the open connections
+
+    async def start(self) -> None:
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_initialize_worker)
+        self._batcher = MicroBatcher(self._executor, self.batch_delay, self.max_batch_size)
+        if self.unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host=self.host, port=self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._executor.shutdown()
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers requests on the connection until the client closes it (HTTP/1.1 keep-alive)."""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, answer = await self._handle_request(method, target, body)
+                content = json.dumps(answer).encode()
+                writer.write(('HTTP/1.1 ' + status + '\r\nContent-Type: application/json\r\nContent-Length: '
+                              + str(len(content)) + '\r\n\r\n').encode() + content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client closed the connection or sent no HTTP
+        finally:
+            writer.close()
+            self._connections.discard(task)
+
+    async def _handle_request(self, method: str, target: str, body: bytes) -> Tuple[str, dict]:
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/health':
+            return '200 OK', {'status': 'ok'}
+        if method != 'POST' or url.path != '/test':
+            return '404 Not Found', {'error': "use GET /health or POST /test"}
+
+        try:
+            key, data = self.parse_request(parse_qs(url.query), body)
+            rows = await self._batcher.submit(key, data)
+        except ValueError as e:
+            return '400 Bad Request', {'error': str(e)}
+        except Exception as e:
+            return '500 Internal Server Error', {'error': type(e).__name__ + ": " + str(e)}
+        return '200 OK', {'results': [self.row_to_dict(row) for row in rows]}
+
+    @staticmethod
+    def parse_request(query: Dict[str, List[str]], body: bytes) -> Tuple[BatchKey, np.array]:
+        test_names = tuple(query.get('tests', ['KsTest'])[0].split(','))
+        for name in test_names:
+            if name not in TEST_CLASSES:
+                raise ValueError("unknown test " + name + ", use one of " + ", ".join(TEST_CLASSES))
+        alphas = tuple(float(alpha) for alpha in query.get('alpha', ['0.05'])[0].split(','))
+        for alpha in alphas:
+            if not 0 < alpha < 1:
+                raise ValueError("alpha must be between 0 and 1, not " + str(alpha))
+        with_p_values = query.get('p_values', ['1'])[0] not in ('0', 'false')
+
+        dtype = DTYPES.get(query.get('dtype', ['float64'])[0])
+        if dtype is None:
+            raise ValueError("dtype must be one of " + ", ".join(DTYPES))
+        if len(body) == 0 or len(body) % dtype.itemsize != 0:
+            raise ValueError("the body must contain at least one " + dtype.name + " value")
+        data = np.frombuffer(body, dtype=dtype).astype(np.float64)
+        if not np.all(np.isfinite(data)):
+            raise ValueError("the data must not contain nan or infinite values")
+        return (test_names, alphas, with_p_values), data
+
+    @staticmethod
+    def row_to_dict(row: np.void) -> dict:
+        p_value = float(row['p_value'])
+        return {'test': str(row['test']), 'alpha': float(row['alpha']), 'n': int(row['n']),
+                'statistic': float(row['statistic']), 'critical_value': float(row['critical_value']),
+                'p_value': None if math.isnan(p_value) else p_value, 'dismissed': bool(row['dismissed'])}
+
+
+def request_evaluation(data: np.array,
+                       tests: List[str] = None,
+                       alphas: List[float] = None,
+                       with_p_values: bool = True,
+                       host: str = '127.0.0.1',
+                       port: int = 8765
+                       ) -> List[dict]:
+    """A minimal client. Sends the data to a running UniformityServer and returns the results."""
+    query = urlencode({'tests': ','.join(tests or ['KsTest']), 'alpha': ','.join(str(a) for a in alphas or [0.05]),
+                       'p_values': int(with_p_values), 'dtype': 'float64'})
+    connection = http.client.HTTPConnection(host, port)
+    try:
+        connection.request('POST', '/test?' + query, body=np.asarray(data, dtype='<f8').tobytes(),
+                           headers={'Content-Type': 'application/octet-stream'})
+        response = connection.getresponse()
+        answer = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise ValueError(answer['error'])
+    return answer['results']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local server for tests of uniform distribution")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of host and port")
+    parser.add_argument('--processes', type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument('--batch-delay', type=float, default=0.005,
+                        help="seconds to wait for further requests of the same kind (default: 0.005)")
+    args = parser.parse_args()
+
+    server = UniformityServer(host=args.host, port=args.port, unix_path=args.unix, processes=args.processes,
+                              batch_delay=args.batch_delay)
+    print("Listening on " + (args.unix or args.host + ":" + str(args.port)))
+    asyncio.run(server.serve_forever())
@@ -0,0 +1,188 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Importance sampling for small tail probabilities of the test statistics, e.g. at alpha = 0.001.
+
+The random vectors are not drawn from the distribution function of interest F (by default the uniform
+distribution), but from a mixture of proposals G_1, ..., G_K, which make large statistics likely, and of F itself:
+each vector is drawn completely from F with probability defensive_weight and from G_k with probability
+(1 - defensive_weight) / K. With f(x) = f(x_1)...f(x_n) for the densities, each vector x gets the likelihood ratio
+
+    w(x) = f(x) / (defensive_weight * f(x) + sum_k (1 - defensive_weight) / K * g_k(x))
+
+as weight. So the mean of w(x) * 1{T(x) > c} is an unbiased estimate of P_F(T > c), and w(x) <= 1 / defensive_weight.
+All distribution functions are PiecewiseLinearFunctions, so their densities are piecewise constant.
+
+The default proposals of get_tilted_cdfs are tents through (p, p +- shift): given that the uniform empirical process
+reaches a high level at p, its most likely path is linear on both sides of p. They work well for the Kolmogorov
+Smirnov and Ln tests. The tails of the Vn tests are caused by single order statistics next to 0 or 1, which no
+tilted distribution function captures well, so their relative errors stay close to plain Monte Carlo.
+
+Example:
+    >>> proposals = get_tilted_cdfs(n=100, alpha=0.001)
+    >>> estimates = estimate_tail_probabilities([KsTest, LnTest], [1.9, 2.6], n=100, m=10 ** 4, proposals=proposals)
+    >>> estimates['Kolmogorov Smirnov test'].relative_error
+"""
+
+from math import log, sqrt
+from typing import Dict, List, Tuple
+import numpy as np
+
+# local file imports
+from simulation.piecewise_linear_function import PiecewiseLinearFunction
+from simulation.statistic_tools import get_sorted_uniform_values
+from statistical_tests.sorted_sample import SortedSample
+
+
+class TailProbabilityEstimate:
+    """probability estimates P(T > critical_value) with the standard error relative_error * probability.
+    The effective sample size is (sum of weights)^2 / (sum of squared weights) of all vectors with T > critical_value.
+    """
+    def __init__(self,
+                 critical_value: float,
+                 probability: float,
+                 relative_error: float,
+                 effective_sample_size: float,
+                 number_of_samples: int):
+        self.critical_value = critical_value
+        self.probability = probability
+        self.relative_error = relative_error
+        self.effective_sample_size = effective_sample_size
+        self.number_of_samples = number_of_samples
+
+    def __repr__(self) -> str:
+        return ("P(T > " + format(self.critical_value, '.4f') + ") = " + format(self.probability, '.3e') + " +- "
+                + format(100 * self.relative_error, '.1f') + " % (" + str(self.number_of_samples) + " samples)")
+
+
+def get_density(cdf: PiecewiseLinearFunction) -> Tuple[np.array, np.array]:
+    """Returns the breakpoints x and the constant density between x[i] and x[i + 1] for each i."""
+    x, y = cdf.get_breakpoints()
+    if np.any(np.diff(x) <= 0):
+        raise ValueError("distribution functions with jumps have no density")
+    return x, np.diff(y) / np.diff(x)
+
+
+def get_log_likelihood(density: Tuple[np.array, np.array], data: np.array) -> np.array:
+    """Returns the sum of the logarithms of the density over the last axis of data. It is -inf iff the density
+    vanishes at some value."""
+    x, values = density
+    segments = np.clip(np.searchsorted(x, data, side='right') - 1, 0, values.size - 1)
+    with np.errstate(divide='ignore'):
+        return np.sum(np.log(values)[segments], axis=-1)
+
+
+def get_tilted_cdfs(n: int, alpha: float, positions: List[float] = None) -> List[PiecewiseLinearFunction]:
+    """Returns the tents through (p, p + shift) and (p, p - shift) for all positions p, where shift is the
+    deviation sqrt(-0.5 * log(alpha) / n), which the one-sided Kolmogorov Smirnov statistic exceeds with
+    probability alpha. Tents, which are not strictly monotone, are left out."""
+    if positions is None:
+        positions = np.linspace(0.05, 0.95, 19)
+    shift = sqrt(-0.5 * log(alpha) / n)
+    result = []
+    for p in positions:
+        for value in [p + shift, p - shift]:
+            if 0.0 < value < 1.0:
+                result.append(PiecewiseLinearFunction([[float(p), float(value)]]))
+    return result
+
+
+def simulate_weighted_statistics(test_classes: List[type],
+                                 n: int,
+                                 m: int,
+                                 proposals: List[PiecewiseLinearFunction],
+                                 cdf: PiecewiseLinearFunction = None,
+                                 defensive_weight: float = 0.2,
+                                 block_size: int = 1000,
+                                 seed: int = None
+                                 ) -> Tuple[np.array, np.array]:
+    """Returns the statistics of m vectors of length n for each test (shape (len(test_classes), m)) and their
+    likelihood ratios (shape (m,)) with respect to cdf, by default the uniform distribution. See module docstring."""
+    if not 0.0 < defensive_weight <= 1.0:
+        raise ValueError("defensive_weight must be in (0, 1]")
+    if cdf is None:
+        cdf = PiecewiseLinearFunction()
+    components = [cdf] + list(proposals)
+    if len(proposals) == 0:
+        defensive_weight = 1.0
+    mixture_weights = np.array([defensive_weight] + [(1 - defensive_weight) / max(len(proposals), 1)]
+                               * len(proposals))
+    breakpoints = [component.get_breakpoints() for component in components]
+    densities = [get_density(component) for component in components]
+
+    rng = np.random.default_rng(seed)
+    tests = [test_class() for test_class in test_classes]
+    statistics = np.empty((len(tests), m))
+    weights = np.empty(m)
+
+    for start in range(0, m, block_size):
+        stop = min(start + block_size, m)
+        chosen = rng.choice(len(components), size=stop - start, p=mixture_weights)
+        block = get_sorted_uniform_values(n, rows=stop - start, rng=rng)
+        for k in np.unique(chosen):
+            x, y = breakpoints[k]
+            block[chosen == k] = np.interp(block[chosen == k], y, x)  # inverse transform sampling keeps the order
+
+        log_likelihoods = np.array([get_log_likelihood(density, block) for density in densities])  # (K + 1, block)
+        log_mixture = log_likelihoods + np.log(mixture_weights)[:, np.newaxis]
+        largest = np.max(log_mixture, axis=0)
+        log_proposal = largest + np.log(np.sum(np.exp(log_mixture - largest), axis=0))
+        weights[start:stop] = np.exp(log_likelihoods[0] - log_proposal)
+
+        sample = SortedSample(block, presorted=True)
+        for t, test in enumerate(tests):
+            test.sample = sample
+            statistics[t, start:stop] = test.get_statistic()
+    return statistics, weights
+
+
+def get_tail_probability_estimate(statistics: np.array, weights: np.array, critical_value: float
+                                  ) -> TailProbabilityEstimate:
+    m = statistics.size
+    weighted = np.where(statistics > critical_value, weights, 0.0)
+    probability = float(np.mean(weighted))
+    if probability == 0.0:
+        return TailProbabilityEstimate(critical_value, 0.0, float('inf'), 0.0, m)
+    standard_error = float(np.std(weighted, ddof=1)) / sqrt(m) if m > 1 else float('inf')
+    effective_sample_size = float(np.sum(weighted) ** 2 / np.sum(weighted ** 2))
+    return TailProbabilityEstimate(critical_value, probability, standard_error / probability, effective_sample_size, m)
+
+
+def estimate_tail_probabilities(test_classes: List[type],
+                                critical_values: List[float],
+                                n: int,
+                                m: int,
+                                proposals: List[PiecewiseLinearFunction],
+                                cdf: PiecewiseLinearFunction = None,
+                                defensive_weight: float = 0.2,
+                                seed: int = None
+                                ) -> Dict[str, TailProbabilityEstimate]:
+    """Returns the estimates of P(T > critical value) under cdf (by default the uniform distribution) for each test.
+    All tests share the same vectors."""
+    statistics, weights = simulate_weighted_statistics(test_classes, n, m, proposals, cdf=cdf,
+                                                       defensive_weight=defensive_weight, seed=seed)
+    return {test_class().get_name(): get_tail_probability_estimate(statistics[t], weights, critical_value)
+            for t, (test_class, critical_value) in enumerate(zip(test_classes, critical_values))}
+
+
+def estimate_critical_values(test_classes: List[type],
+                             alpha: float,
+                             n: int,
+                             m: int,
+                             proposals: List[PiecewiseLinearFunction] = None,
+                             defensive_weight: float = 0.2,
+                             seed: int = None
+                             ) -> Dict[str, TailProbabilityEstimate]:
+    """Returns the estimated critical values of all tests for vectors of length n under H0 as the smallest simulated
+    statistic c with estimated P(T > c) <= alpha, together with the estimate of P(T > c).
+    The proposals are get_tilted_cdfs(n, alpha) by default."""
+    if proposals is None:
+        proposals = get_tilted_cdfs(n, alpha)
+    statistics, weights = simulate_weighted_statistics(test_classes, n, m, proposals,
+                                                       defensive_weight=defensive_weight, seed=seed)
+    result = {}
+    for t, test_class in enumerate(test_classes):
+        order = np.argsort(statistics[t])[::-1]
+        tail = np.cumsum(weights[order]) / m  # tail[i] estimates P(T >= statistics[t, order[i]])
+        index = min(int(np.searchsorted(tail, alpha, side='right')), m - 1)
+        critical_value = float(statistics[t, order[index]])
+        result[test_class().get_name()] = get_tail_probability_estimate(statistics[t], weights, critical_value)
+    return result
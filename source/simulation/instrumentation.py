@@ -0,0 +1,134 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Named timers and counters for finding out where a simulation spends its time.
+
+Everything is disabled by default. Then a timer is a shared object whose __enter__ and __exit__ do nothing and
+counting returns immediately, so the instrumentation can stay in the hot loops.
+
+Example:
+    >>> instrumentation.enable(trace=True)
+    >>> with instrumentation.timer('sorting'):
+    ...     np.sort(np.random.uniform(size=1000))
+    >>> instrumentation.count('table misses')
+    >>> instrumentation.maximum('peak memory [bytes]', 2 ** 20)
+    >>> print(instrumentation.get_summary())
+    >>> instrumentation.save_chrome_trace('trace.json')  # open with chrome://tracing or https://ui.perfetto.dev
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+
+class _NullTimer:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, instrumentation: 'Instrumentation', name: str):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start_time = 0.0
+
+    def __enter__(self) -> None:
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, *args) -> None:
+        self.instrumentation.add_time(self.name, self.start_time, time.perf_counter())
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self.timers = {}  # name -> [number of calls, total seconds]
+        self.counters = {}  # name -> count
+        self.maxima = {}  # name -> largest recorded value, e.g. of the memory
+        self.events = []  # (name, start, stop, process id, thread id) iff self.trace
+        self._lock = threading.Lock()
+
+    def enable(self, trace: bool = False) -> None:
+        """Starts measuring. If trace is True, every single timer call is stored for save_chrome_trace."""
+        self.enabled = True
+        self.trace = trace
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.maxima = {}
+            self.events = []
+
+    def timer(self, name: str):
+        """Returns a context manager which measures the time of its block under the given name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name: str, start_time: float, stop_time: float) -> None:
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += stop_time - start_time
+            if self.trace:
+                self.events.append((name, start_time, stop_time, os.getpid(), threading.get_ident()))
+
+    def count(self, name: str, increment: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + increment
+
+    def maximum(self, name: str, value: float) -> None:
+        """Records the value iff it is larger than all values recorded under that name before."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.maxima[name] = max(self.maxima.get(name, value), value)
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {
+            'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()},
+            'counters': dict(self.counters),
+            'maxima': dict(self.maxima)
+        }
+
+    def get_summary(self) -> str:
+        total = sum(seconds for calls, seconds in self.timers.values())
+        lines = ["Instrumentation summary:"]
+        for name, (calls, seconds) in sorted(self.timers.items(), key=lambda item: -item[1][1]):
+            share = 100 * seconds / total if total > 0 else 0.0
+            lines.append("  " + name + ": " + format(seconds, '.4f') + " s in " + str(calls) + " calls ("
+                         + format(share, '.1f') + " %)")
+        for name, count in sorted(self.counters.items()):
+            lines.append("  " + name + ": " + str(count))
+        for name, value in sorted(self.maxima.items()):
+            lines.append("  maximum of " + name + ": " + str(value))
+        return '\n'.join(lines)
+
+    def save_json(self, filename: str) -> None:
+        with open(filename, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def save_chrome_trace(self, filename: str) -> None:
+        """Saves all timer calls in the Chrome trace event format. Requires enable(trace=True)."""
+        events = [{'name': name, 'ph': 'X', 'ts': start * 10 ** 6, 'dur': (stop - start) * 10 ** 6,
+                   'pid': pid, 'tid': tid} for name, start, stop, pid, tid in self.events]
+        events += [{'name': name, 'ph': 'C', 'ts': 0, 'pid': os.getpid(), 'args': {name: count}}
+                   for name, count in list(self.counters.items()) + list(self.maxima.items())]
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': events}, file)
+
+
+instrumentation = Instrumentation()  # used by the simulation, the statistical tests and the quantile tables
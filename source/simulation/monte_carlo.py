@@ -1,14 +1,23 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 
+import os
+from math import sqrt
+from typing import Dict, List
 import numpy as np
 
 # local file imports
-from simulation.statistic_tools import get_cdf_uniform_with_eps_error, get_random_values
+from simulation.statistic_tools import get_cdf_uniform_with_eps_error, get_random_values, get_sorted_random_values
 from statistical_tests.ks_test import KsTest
-from plotting.plotting import plot, FunctionToPlot
 from simulation.test_wrapper import WrappedStatisticalTest
 from simulation.piecewise_linear_function import PiecewiseLinearFunction
 from statistical_tests.statistical_test import StatisticalTest
+from statistical_tests.sorted_sample import SortedSample
+from simulation.instrumentation import instrumentation
+from simulation.progress import ProgressReporter
+from simulation.parallel_simulation import simulate_statistics, DEFAULT_MEMORY_BUDGET
+from simulation.importance_sampling import TailProbabilityEstimate, estimate_critical_values, \
+    estimate_tail_probabilities, get_tilted_cdfs
+from simulation.work_queue import WorkQueue, SWEEP_FILENAME, DEFAULT_LEASE_TIMEOUT
 
 
 class MonteCarloSimulation:
@@ -24,12 +33,13 @@ class MonteCarloSimulation:
         self.epsilon = epsilon
         self.max_iter = max_iter
         self.tests = []
+        self.wrapped_tests = []  # of the last run of plot_quality_function
 
     def add_test(self, test: StatisticalTest) -> None:
         self.tests.append(test)
 
     def __get_exact_critical_value(self, data: np.array) -> float:
-        return np.quantile(data, q=(1 - self.alpha), interpolation='lower')
+        return np.quantile(data, q=(1 - self.alpha), method='lower')
 
     def get_exact_critical_value(self) -> float:
         """Returns the so called exact critical value of the Kolmogorov Smirnov test"""
@@ -46,12 +56,94 @@ class MonteCarloSimulation:
         print("c_n=", c_n, "; exact critical value=", critical_value)
         return critical_value
 
+    def estimate_rejection_probabilities(self,
+                                         cdf: PiecewiseLinearFunction = None,
+                                         number_of_vectors: int = None,
+                                         proposals: List[PiecewiseLinearFunction] = None,
+                                         seed: int = None
+                                         ) -> Dict[str, TailProbabilityEstimate]:
+        """Returns the probability, that each test dismisses H_0 for random vectors following cdf (by default the
+        uniform distribution, i.e. the real level), estimated by importance sampling with its relative error.
+        Needs far less vectors than test_arbitrary_cdf for small alpha or tiny disturbances, see importance_sampling.py
+        The proposals are get_tilted_cdfs(self.n, self.alpha) by default."""
+        critical_values = [test.get_cached_critical_value(alpha=self.alpha, epsilon=self.epsilon,
+                                                          max_iter=self.max_iter, n=test.get_critical_value_n(self.n))
+                           for test in self.tests]
+        if proposals is None:
+            proposals = get_tilted_cdfs(self.n, self.alpha)
+        return estimate_tail_probabilities([type(test) for test in self.tests], critical_values, self.n,
+                                           number_of_vectors or self.m, proposals, cdf=cdf, seed=seed)
+
+    def estimate_critical_values(self, number_of_vectors: int = None, seed: int = None
+                                 ) -> Dict[str, TailProbabilityEstimate]:
+        """Returns the critical values of all tests for vectors of length self.n at level self.alpha, estimated by
+        importance sampling. Unlike get_exact_critical_value, this is feasible for tiny alpha."""
+        return estimate_critical_values([type(test) for test in self.tests], self.alpha, self.n,
+                                        number_of_vectors or self.m, seed=seed)
+
+    def run_on_work_queue(self,
+                          directory: str,
+                          epsilon_max: float = 0.05,
+                          resolution: int = 20,
+                          error_position: float = 0.1,
+                          error_delta: float = 1.,
+                          block_size: int = 1000,
+                          seed: int = None,
+                          work: bool = True,
+                          lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+                          poll_interval: float = 1.0
+                          ) -> Dict[float, Dict[str, float]]:
+        """Distributes the simulation of plot_quality_function over all machines, which run workers on the shared
+        directory (see work_queue.py), and returns the empirical probability of dismissing H0 for each epsilon and
+        test name. This process works on the tasks as well iff work. The sweep is resumed, if it exists already.
+        Raises ValueError if the existing sweep has other tests, n, epsilons, m, alpha or error."""
+        queue = WorkQueue(directory, lease_timeout=lease_timeout)
+        epsilons = np.linspace(start=min(0.0, epsilon_max), stop=max(0.0, epsilon_max), num=resolution)
+        if os.path.exists(os.path.join(directory, SWEEP_FILENAME)):
+            expected = {'test_names': [test.get_name() for test in self.tests],
+                        'epsilons': [float(epsilon) for epsilon in epsilons], 'm': self.m, 'alpha': self.alpha,
+                        'error_position': error_position, 'error_delta': error_delta}
+            differences = [key for key, value in expected.items() if queue.sweep[key] != value]
+            if self.n not in queue.sweep['n_values']:
+                differences.append('n_values')
+            if differences:
+                raise ValueError("the sweep in " + directory + " has other " + ", ".join(differences)
+                                 + ", use another directory")
+        else:
+            queue.create_sweep([type(test) for test in self.tests], [self.n], epsilons, self.m, self.alpha,
+                               error_position, error_delta=error_delta, block_size=block_size, seed=seed,
+                               epsilon=self.epsilon, max_iter=self.max_iter)
+        if work:
+            queue.work(poll_interval=poll_interval)
+        queue.wait(poll_interval=poll_interval)
+        return queue.get_rejection_rates()[self.n]
+
+    def get_power_curves(self, alphas: List[float]) -> Dict[float, Dict[str, Dict[float, float]]]:
+        """Returns the empirical probability of dismissing H0 for each alpha, test name and epsilon from the statistics
+        of the last run of plot_quality_function, i.e. without new samples. Each test uses its critical value for
+        vectors of length self.n at each alpha."""
+        if not self.wrapped_tests or not all(w_test.statistics for w_test in self.wrapped_tests):
+            raise ValueError("run plot_quality_function with keep_statistics=True first")
+
+        result = {}
+        for alpha in alphas:
+            result[alpha] = {}
+            for w_test in self.wrapped_tests:
+                test = w_test.test
+                n = test.get_critical_value_n(self.n)
+                critical_value = test.get_cached_critical_value(alpha=alpha, epsilon=self.epsilon,
+                                                                max_iter=self.max_iter, n=n)
+                result[alpha][test.get_name()] = {
+                    epsilon: float(w_test.get_empirical_probability_h0_dismissed(epsilon, critical_value))
+                    for epsilon in w_test.statistics}
+        return result
+
     def test_arbitrary_cdf(self, test: StatisticalTest, cdf: PiecewiseLinearFunction) -> float:
         """Returns empirical probability of test dismisses H_0 (not uniform distributed).
            For testing, random vectors are generated, which follow the given cdf.
            For n to infinity, the return value converges to self.alpha, if the given data is really uniform distributed.
         """
-        d_alpha = test.get_critical_value(alpha=self.alpha, epsilon=self.epsilon, max_iter=self.max_iter)
+        d_alpha = test.get_cached_critical_value(alpha=self.alpha, epsilon=self.epsilon, max_iter=self.max_iter)
 
         empirical_probability_h0_dismissed = 0.0
         for i in range(self.m):
@@ -62,40 +154,163 @@ class MonteCarloSimulation:
                 empirical_probability_h0_dismissed += 1 / self.m
         return empirical_probability_h0_dismissed
 
+    def __simulate_in_parallel(self,
+                               wrapped_tests: List[WrappedStatisticalTest],
+                               epsilons: np.array,
+                               cdfs: List[PiecewiseLinearFunction],
+                               processes: int,
+                               progress: ProgressReporter,
+                               memory_budget: int,
+                               dtype: str,
+                               keep_statistics: bool) -> None:
+        """Stores the empirical probabilities of dismissing H0 (and the sorted statistics iff keep_statistics)
+        in the wrapped tests."""
+        critical_values = np.array([w_test.critical_value for w_test in wrapped_tests])[:, np.newaxis]
+
+        def report(cdf_index: int, start: int, stop: int, results: np.array) -> None:
+            if progress is not None:
+                rejections = np.sum(results[cdf_index, :, start:stop] > critical_values, axis=-1)
+                progress.update(epsilons[cdf_index], stop - start,
+                                {w_test.test.get_name(): int(r) for w_test, r in zip(wrapped_tests, rejections)})
+
+        statistics = simulate_statistics([type(w_test.test) for w_test in wrapped_tests], cdfs, self.n, self.m,
+                                         processes=processes, callback=report, memory_budget=memory_budget,
+                                         dtype=dtype)
+        instrumentation.count('samples', self.m * len(cdfs))
+        rates = np.mean(statistics > critical_values, axis=-1)
+        for t, w_test in enumerate(wrapped_tests):
+            for c, epsilon in enumerate(epsilons):
+                w_test.empirical_probability_h0_dismissed[epsilon] = float(rates[c, t])
+                if keep_statistics:
+                    w_test.statistics[epsilon] = np.sort(statistics[c, t])
+
+    def __simulate(self,
+                   wrapped_tests: List[WrappedStatisticalTest],
+                   epsilons: np.array,
+                   error_position: float,
+                   error_delta: float,
+                   progress: ProgressReporter,
+                   processes: int,
+                   memory_budget: int,
+                   dtype: str,
+                   keep_statistics: bool) -> None:
+        """Stores the empirical probabilities of dismissing H0 for self.m vectors of each epsilon in the wrapped
+        tests."""
+        disturbed_cdfs = [get_cdf_uniform_with_eps_error(epsilon=epsilon, error_position=error_position,
+                                                         delta=error_delta) for epsilon in epsilons]
+        if processes != 1:
+            with instrumentation.timer('parallel simulation'):
+                self.__simulate_in_parallel(wrapped_tests, epsilons, disturbed_cdfs, processes, progress,
+                                            memory_budget, dtype, keep_statistics)
+            return
+
+        for epsilon, cdf_with_eps_error in zip(epsilons, disturbed_cdfs):
+            for i in range(self.m):
+                with instrumentation.timer('sampling'):
+                    random_values = get_sorted_random_values(cdf_with_eps_error, size=self.n)
+                # share the sorted values and the extrema of the uniform empirical process between all tests
+                sample = SortedSample(random_values, presorted=True)
+
+                rejections = {}
+                with instrumentation.timer('statistics'):
+                    for w_test in wrapped_tests:
+                        w_test.test.sample = sample
+
+                        if epsilon not in w_test.empirical_probability_h0_dismissed:
+                            w_test.empirical_probability_h0_dismissed[epsilon] = 0.0
+                            if keep_statistics:
+                                w_test.statistics[epsilon] = np.empty(self.m)
+                        statistic = w_test.test.get_statistic()
+                        if keep_statistics:
+                            w_test.statistics[epsilon][i] = statistic
+                        if statistic > w_test.critical_value:  # if test dismisses H_0
+                            w_test.empirical_probability_h0_dismissed[epsilon] += 1 / self.m
+                            rejections[w_test.test.get_name()] = 1
+                instrumentation.count('samples')
+                if progress is not None:
+                    progress.update(epsilon, 1, rejections)
+            for w_test in wrapped_tests:
+                if keep_statistics:
+                    w_test.statistics[epsilon].sort()
+
+    def __refine_epsilons(self,
+                          wrapped_tests: List[WrappedStatisticalTest],
+                          epsilons: np.array,
+                          sample_budget: int,
+                          progress: ProgressReporter,
+                          **simulation_arguments) -> np.array:
+        """Returns the sorted epsilons including the new ones. In each round, the intervals between neighbouring
+        epsilons are split in the middle, in which the empirical probability of dismissing H0 of some test changes by
+        at least half of the largest change. Changes below two standard deviations of the difference of two
+        estimates are noise and never split. It stops when the next epsilon would exceed sample_budget."""
+        epsilons = sorted(float(epsilon) for epsilon in epsilons)
+        noise = 2 * sqrt(2 * 0.25 / self.m)  # the variance of an estimate is at most 0.25 / self.m
+        while (len(epsilons) + 1) * self.m <= sample_budget:
+            changes = [max(abs(w_test.empirical_probability_h0_dismissed[b]
+                               - w_test.empirical_probability_h0_dismissed[a]) for w_test in wrapped_tests)
+                       for a, b in zip(epsilons[:-1], epsilons[1:])]
+            largest = max(changes)
+            if largest <= noise:
+                break
+            order = np.argsort(changes)[::-1]
+            chosen = [i for i in order if changes[i] >= largest / 2 and changes[i] > noise]
+            chosen = chosen[:sample_budget // self.m - len(epsilons)]
+            new_epsilons = [(epsilons[i] + epsilons[i + 1]) / 2 for i in chosen]
+
+            if progress is not None:
+                progress.add_epsilons(new_epsilons)
+            self.__simulate(wrapped_tests, np.array(new_epsilons), progress=progress, **simulation_arguments)
+            epsilons = sorted(epsilons + new_epsilons)
+        return np.array(epsilons)
+
     def plot_quality_function(self,
                               epsilon_max: float = 0.05,
                               resolution: int = 20,
                               error_position: float = 0.1,
                               error_delta: float = 1.,
                               plot_cdfs: bool = False,
+                              progress: ProgressReporter = None,
+                              processes: int = 1,
+                              memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                              dtype: str = 'float64',
+                              keep_statistics: bool = True,
+                              sample_budget: int = None,
                               **kwargs) -> None:
-        """Complexity: O(self.m * self.n * resolution * len(self.statistical_tests))"""
+        """Complexity: O(self.m * self.n * resolution * len(self.statistical_tests))
+        If simulation.instrumentation.instrumentation is enabled, the time of each stage is measured and a summary
+        is printed at the end. The progress is reported to progress, if given.
+        If processes != 1, the vectors are simulated block by block in that many worker processes (all cores iff
+        None), see parallel_simulation.py. The blocks are then sized to fit into memory_budget bytes and
+        dtype='float32' halves the memory of samples and statistics.
+        If keep_statistics, all simulated statistics are kept (self.m * resolution values per test), so that
+        get_power_curves can compute the power for other alphas afterwards without new samples.
+        If sample_budget is given, the resolution epsilons are only the start: further epsilons are inserted where
+        the empirical probabilities of dismissing H0 change most, until sample_budget vectors are simulated in total
+        (self.m per epsilon). See __refine_epsilons"""
+        if sample_budget is not None and resolution * self.m > sample_budget:
+            raise ValueError("sample_budget must cover at least the resolution * number_of_vectors starting vectors")
+        from plotting.plotting import plot, FunctionToPlot  # imported lazily, because matplotlib is slow to import
 
         wrapped_tests = []
-        for test in self.tests:
-            wrapped_tests.append(WrappedStatisticalTest(test, test.get_critical_value(
-                alpha=self.alpha, epsilon=self.epsilon, max_iter=self.max_iter, n=self.n
-            )))
+        with instrumentation.timer('critical values'):
+            for test in self.tests:
+                wrapped_tests.append(WrappedStatisticalTest(test, test.get_cached_critical_value(
+                    alpha=self.alpha, epsilon=self.epsilon, max_iter=self.max_iter, n=test.get_critical_value_n(self.n)
+                )))
 
         epsilons = np.linspace(start=min(0.0, epsilon_max), stop=max(0.0, epsilon_max), num=resolution)
-        cdfs = []
-
-        for epsilon in epsilons:
-            cdf_with_eps_error = get_cdf_uniform_with_eps_error(
-                    epsilon=epsilon, error_position=error_position, delta=error_delta
-                )
-            cdfs.append(FunctionToPlot(cdf_with_eps_error.function, label='epsilon=' + str(epsilon)))
+        if progress is not None:
+            progress.start(epsilons, self.m, [w_test.test.get_name() for w_test in wrapped_tests])
+        simulation_arguments = dict(error_position=error_position, error_delta=error_delta, progress=progress,
+                                    processes=processes, memory_budget=memory_budget, dtype=dtype,
+                                    keep_statistics=keep_statistics)
+        self.__simulate(wrapped_tests, epsilons, **simulation_arguments)
+        if sample_budget is not None:
+            epsilons = self.__refine_epsilons(wrapped_tests, epsilons, sample_budget, **simulation_arguments)
 
-            for i in range(self.m):
-                random_values = get_random_values(cdf_with_eps_error, size=self.n)
-
-                for w_test in wrapped_tests:
-                    w_test.test.data = random_values
-
-                    if w_test.test.get_statistic() > w_test.critical_value:  # if test dismisses H_0
-                        if epsilon not in w_test.empirical_probability_h0_dismissed:
-                            w_test.empirical_probability_h0_dismissed[epsilon] = 0.0
-                        w_test.empirical_probability_h0_dismissed[epsilon] += 1 / self.m
+        if progress is not None:
+            progress.finish()
+        self.wrapped_tests = wrapped_tests
 
         functions_to_plot = [FunctionToPlot(lambda x: self.alpha, label='alpha', color='k')]
         for w_test in wrapped_tests:
@@ -104,10 +319,17 @@ class MonteCarloSimulation:
                                label=w_test.test.get_name(), color=w_test.test.color)
             )
 
-        if plot_cdfs:
-            plot(cdfs, title="Gestörte Verteilungsfunktionen")
-        plot(functions_to_plot, x_min=min(0., epsilon_max), x_max=max(0., epsilon_max), resolution=resolution,
-             title="Vergleich Gütefunktionen; epsilon max=" + str(epsilon_max) + ", resolution=" + str(resolution)
-                   + ", delta=" + str(error_delta) + ", error position=" + str(error_position),
-             **kwargs
-             )
+        with instrumentation.timer('plotting'):
+            if plot_cdfs:
+                cdfs = [FunctionToPlot(get_cdf_uniform_with_eps_error(epsilon=epsilon, error_position=error_position,
+                                                                      delta=error_delta).function,
+                                       label='epsilon=' + str(epsilon)) for epsilon in epsilons]
+                plot(cdfs, title="Gestörte Verteilungsfunktionen")
+            plot(functions_to_plot, x_min=min(0., epsilon_max), x_max=max(0., epsilon_max), x_values=epsilons,
+                 title="Vergleich Gütefunktionen; epsilon max=" + str(epsilon_max) + ", resolution="
+                       + str(len(epsilons)) + ", delta=" + str(error_delta) + ", error position=" + str(error_position),
+                 **kwargs
+                 )
+
+        if instrumentation.enabled:
+            print(instrumentation.get_summary())
@@ -0,0 +1,226 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Block-wise simulation of test statistics in worker processes with shared memory.
+
+The main process allocates one sample buffer per worker and one result array of shape
+(number of distribution functions, number of tests, m) in multiprocessing.shared_memory, exactly once.
+The distribution functions are sent once to each worker as breakpoint arrays (see
+PiecewiseLinearFunction.get_breakpoints), because their closures cannot be pickled. A task consists only of
+(index of the distribution function, first and last sample, seed), so the communication between the processes does
+not depend on n and m: each worker samples into its own buffer, sorts it in place and writes the statistics of all
+tests directly into the result array.
+
+The seeds are derived from one numpy SeedSequence per task, so the result depends only on seed and block_size,
+not on the number of processes.
+
+Without a given block_size, it is chosen by get_block_size such that the buffers and intermediate arrays of all
+workers fit into memory_budget bytes (and the working set of one block into cache_size bytes, if given). The buffers
+are reused for all blocks and sorted in place. With dtype='float32', the samples and statistics need half of the
+memory. The order statistics are then rounded to multiples of 2^-24, which changes the statistics of the (weighted)
+uniform empirical process by at most about sqrt(n) * 2^-24 (times the weight). If simulation.instrumentation is
+enabled, the peak memory of a run is recorded as the maximum 'peak memory [bytes]'.
+
+Example:
+    >>> cdfs = [get_cdf_uniform_with_eps_error(epsilon, 0.5, 0.1) for epsilon in [0.0, 0.05]]
+    >>> statistics = simulate_statistics([KsTest, VnTest], cdfs, n=100, m=10 ** 5, processes=4)
+    >>> np.mean(statistics[1, 0] > KsTest().get_critical_value(0.05, n=100))  # power of the KS test at epsilon=0.05
+"""
+
+import multiprocessing
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Tuple
+import numpy as np
+
+# local file imports
+from simulation.piecewise_linear_function import PiecewiseLinearFunction
+from simulation.statistic_tools import get_sorted_uniform_values
+from statistical_tests.sorted_sample import SortedSample
+from statistical_tests import kernels
+from simulation.instrumentation import instrumentation
+
+DEFAULT_MEMORY_BUDGET = 2 ** 30  # bytes
+WORKING_BYTES_PER_VALUE = {'numpy': 64, 'numba': 16}  # measured peak of intermediate arrays per sample value
+DTYPES = ('float64', 'float32')
+
+ArrayDescriptor = Tuple[str, Tuple[int, ...], str]  # name of the shared memory, shape, dtype
+
+
+def create_shared_array(shape: Tuple[int, ...], dtype: str = 'float64') -> Tuple[shared_memory.SharedMemory,
+                                                                                  np.array]:
+    """Returns the shared memory and a numpy array on it. The caller must close and unlink the shared memory."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def attach_shared_array(descriptor: ArrayDescriptor) -> Tuple[shared_memory.SharedMemory, np.array]:
+    """Returns the shared memory with the given name and a numpy array on it, without copying."""
+    name, shape, dtype = descriptor
+    # the workers share the resource tracker of the main process, which unlinks the memory only once
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def get_block_size(n: int,
+                   m: int,
+                   processes: int = 1,
+                   memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                   cache_size: int = None,
+                   dtype: str = 'float64') -> int:
+    """Returns the largest number of vectors of length n, such that one block in each of the processes with all its
+    intermediate arrays fits into memory_budget bytes, and one block into cache_size bytes iff cache_size is given.
+    It is at least 1 and at most m."""
+    bytes_per_vector = n * (np.dtype(dtype).itemsize + WORKING_BYTES_PER_VALUE[kernels.get_backend()])
+    block_size = memory_budget // (processes * bytes_per_vector)
+    if cache_size is not None:
+        block_size = min(block_size, cache_size // bytes_per_vector)
+    return int(max(1, min(block_size, m)))
+
+
+def _simulate_block(tests: list,
+                    breakpoints: Tuple[np.array, np.array],
+                    buffer: np.array,
+                    results: np.array,
+                    cdf_index: int,
+                    start: int,
+                    stop: int,
+                    seed: int) -> None:
+    """Samples stop - start vectors of the distribution function into the buffer by inverse transform sampling of
+    sorted uniform values, which keeps them sorted, and writes their statistics into results[cdf_index, :, start:stop].
+    """
+    x, y = breakpoints
+    block = buffer[:stop - start]
+    get_sorted_uniform_values(block.shape[-1], rows=block.shape[0], rng=np.random.default_rng(seed), out=block)
+    block[...] = np.interp(block, y, x)
+    sample = SortedSample(block, presorted=True)
+    for t, test in enumerate(tests):
+        test.sample = sample
+        results[cdf_index, t, start:stop] = test.get_statistic()
+
+
+_worker = {}  # the state of a worker process, see _initialize_worker
+
+
+def _initialize_worker(test_classes: List[type],
+                       breakpoints: List[Tuple[np.array, np.array]],
+                       buffers_descriptor: ArrayDescriptor,
+                       results_descriptor: ArrayDescriptor,
+                       free_slots,
+                       backend: str,
+                       trace_memory: bool) -> None:
+    buffers_memory, buffers = attach_shared_array(buffers_descriptor)
+    results_memory, results = attach_shared_array(results_descriptor)
+    kernels.set_backend(backend)
+    _worker.update(tests=[test_class() for test_class in test_classes], breakpoints=breakpoints,
+                   buffer=buffers[free_slots.get()], results=results, memories=[buffers_memory, results_memory],
+                   trace_memory=trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+
+
+def _run_task(cdf_index: int, start: int, stop: int, seed: int) -> Tuple[int, int, int, int]:
+    """Returns the task and the peak of the memory allocated by the task (0 iff it is not measured)."""
+    if _worker['trace_memory']:
+        tracemalloc.reset_peak()
+    _simulate_block(_worker['tests'], _worker['breakpoints'][cdf_index], _worker['buffer'], _worker['results'],
+                    cdf_index, start, stop, seed)
+    peak = tracemalloc.get_traced_memory()[1] if _worker['trace_memory'] else 0
+    return cdf_index, start, stop, peak
+
+
+def simulate_statistics(test_classes: List[type],
+                        cdfs: List[PiecewiseLinearFunction],
+                        n: int,
+                        m: int,
+                        processes: int = None,
+                        block_size: int = None,
+                        seed: int = None,
+                        callback: Callable[[int, int, int, np.array], None] = None,
+                        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                        cache_size: int = None,
+                        dtype: str = 'float64'
+                        ) -> np.array:
+    """Returns the statistics of m random vectors of length n for each distribution function and test as an array
+    of shape (len(cdfs), len(test_classes), m).
+
+    Parameters:
+        processes (int): The number of worker processes. Uses all cores iff None and no processes iff 1.
+        block_size (int): The number of vectors which are sampled, sorted and evaluated at once.
+            Is chosen by get_block_size from memory_budget and cache_size iff None.
+        seed (int): Makes the result reproducible.
+        callback: Is called with (index of the distribution function, start, stop, results) after each block,
+            e.g. for reporting the progress. results[cdf_index, :, start:stop] are the new statistics.
+        memory_budget (int): The bytes for the sample buffers and intermediate arrays of all processes.
+            The result array needs len(cdfs) * len(test_classes) * m values in addition.
+        cache_size (int): The bytes of the cache, which the working set of one block should fit in, e.g. of L2.
+        dtype (str): 'float64' or 'float32' for the samples and the statistics.
+    """
+    if dtype not in DTYPES:
+        raise ValueError("dtype must be one of " + ", ".join(DTYPES))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if block_size is None:
+        block_size = get_block_size(n, m, processes, memory_budget, cache_size, dtype)
+    block_size = min(block_size, m)
+
+    breakpoints = [cdf.get_breakpoints() for cdf in cdfs]
+    tasks = [(c, start, min(start + block_size, m)) for c in range(len(cdfs)) for start in range(0, m, block_size)]
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(tasks))]
+    shape = (len(cdfs), len(test_classes), m)
+    trace_memory = instrumentation.enabled
+
+    if processes == 1:
+        tests = [test_class() for test_class in test_classes]
+        buffer = np.empty((block_size, n), dtype=dtype)
+        results = np.empty(shape, dtype=dtype)
+        was_tracing = tracemalloc.is_tracing()
+        if trace_memory and not was_tracing:
+            tracemalloc.start()
+        peak = 0
+        for (c, start, stop), task_seed in zip(tasks, seeds):
+            if trace_memory:
+                tracemalloc.reset_peak()
+            _simulate_block(tests, breakpoints[c], buffer, results, c, start, stop, task_seed)
+            if trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if callback is not None:
+                callback(c, start, stop, results)
+        if trace_memory and not was_tracing:
+            tracemalloc.stop()
+        _record_memory(buffer.nbytes + results.nbytes + peak, block_size)
+        return results
+
+    buffers_memory, buffers = create_shared_array((processes, block_size, n), dtype)
+    results_memory, results = create_shared_array(shape, dtype)
+    try:
+        free_slots = multiprocessing.Queue()
+        for slot in range(processes):
+            free_slots.put(slot)
+        buffers_descriptor = (buffers_memory.name, buffers.shape, buffers.dtype.str)
+        results_descriptor = (results_memory.name, results.shape, results.dtype.str)
+
+        peak = 0
+        with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker,
+                                 initargs=(test_classes, breakpoints, buffers_descriptor, results_descriptor,
+                                           free_slots, kernels.get_backend(), trace_memory)) as executor:
+            futures = [executor.submit(_run_task, c, start, stop, task_seed)
+                       for (c, start, stop), task_seed in zip(tasks, seeds)]
+            for future in futures:
+                c, start, stop, task_peak = future.result()
+                peak = max(peak, task_peak)
+                if callback is not None:
+                    callback(c, start, stop, results)
+        _record_memory(buffers.nbytes + results.nbytes + processes * peak, block_size)
+        return results.copy()
+    finally:
+        del buffers, results  # the shared memory cannot be closed while numpy arrays use it
+        for memory in [buffers_memory, results_memory]:
+            memory.close()
+            memory.unlink()
+
+
+def _record_memory(peak: int, block_size: int) -> None:
+    """The peak is the memory of the buffers and results plus the largest intermediate arrays of each process."""
+    instrumentation.maximum('peak memory [bytes]', peak)
+    instrumentation.maximum('block size', block_size)
@@ -3,9 +3,7 @@
 from __future__ import annotations
 import math
 from typing import Callable, List
-
-# local file imports
-from plotting import plotting
+import numpy as np
 
 
 class PiecewiseLinearFunction:
@@ -71,6 +69,7 @@ class PiecewiseLinearFunction:
              title: str = "Piecewise linear function",
              **kwargs
              ) -> None:
+        from plotting import plotting  # imported lazily, because matplotlib is slow to import
         functions = []
         if with_inverse:
             functions.append(plotting.FunctionToPlot(self.inverse, "f^{-1}", color='b'))
@@ -86,6 +85,13 @@ class PiecewiseLinearFunction:
 
         return self.__get_affine_linear_function(inversed_points)
 
+    def get_breakpoints(self) -> (np.array, np.array):
+        """Returns the x and y values of all points. So np.interp(x, *f.get_breakpoints()) is f(x) and
+        np.interp(y, *reversed(f.get_breakpoints())) is the inverse, both for arrays and without closures,
+        which cannot be pickled."""
+        points = np.array(self.list_of_points, dtype=np.float64)
+        return points[:, 0].copy(), points[:, 1].copy()
+
     def is_strictly_monotone_increasing(self) -> bool:
         tmp = -1
         for x, y in self.list_of_points:
@@ -0,0 +1,97 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Live progress of long simulations: completion per epsilon, samples per second, ETA and rejection rates."""
+
+import time
+from typing import Callable, Dict, List
+
+
+class ProgressReporter:
+    """Collects the progress of a simulation and reports it at most every refresh_interval seconds,
+    so it can be updated after every single sample without slowing down the simulation.
+
+    Parameters:
+        refresh_interval (float): The minimal number of seconds between two reports.
+        callback: Is called with the dictionary of get_state() at each report, e.g. for recording throughput.
+        printing (bool): Prints a status line at each report iff True.
+
+    Example:
+        >>> simulation.plot_quality_function(epsilon_max=0.1, progress=ProgressReporter(refresh_interval=2.0))
+    """
+    def __init__(self, refresh_interval: float = 1.0, callback: Callable[[dict], None] = None, printing: bool = True):
+        self.refresh_interval = refresh_interval
+        self.callback = callback
+        self.printing = printing
+        self.start(epsilons=[], samples_per_epsilon=0, test_names=[])
+
+    def start(self, epsilons: List[float], samples_per_epsilon: int, test_names: List[str]) -> None:
+        """Is called by the simulation before the first sample."""
+        self.epsilons = [float(epsilon) for epsilon in epsilons]
+        self.samples_per_epsilon = samples_per_epsilon
+        self.test_names = list(test_names)
+        self.samples = {epsilon: 0 for epsilon in self.epsilons}
+        self.rejections = {epsilon: {name: 0 for name in self.test_names} for epsilon in self.epsilons}
+        self.current_epsilon = self.epsilons[0] if self.epsilons else 0.0
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+
+    def add_epsilons(self, epsilons: List[float]) -> None:
+        """Is called by the simulation, when it refines the grid of epsilons adaptively."""
+        for epsilon in epsilons:
+            epsilon = float(epsilon)
+            self.epsilons.append(epsilon)
+            self.samples[epsilon] = 0
+            self.rejections[epsilon] = {name: 0 for name in self.test_names}
+
+    def update(self, epsilon: float, samples: int = 1, rejections: Dict[str, int] = None) -> None:
+        """Adds the given number of finished samples and rejections per test for the given epsilon."""
+        epsilon = float(epsilon)
+        self.current_epsilon = epsilon
+        self.samples[epsilon] += samples
+        if rejections:
+            for name, count in rejections.items():
+                self.rejections[epsilon][name] += count
+
+        now = time.perf_counter()
+        if now - self.last_report_time >= self.refresh_interval:
+            self.last_report_time = now
+            self.report()
+
+    def finish(self) -> None:
+        self.report()
+        if self.printing:
+            print()
+
+    def get_completed_samples(self) -> int:
+        return sum(self.samples.values())
+
+    def get_state(self) -> dict:
+        elapsed = time.perf_counter() - self.start_time
+        completed = self.get_completed_samples()
+        total = self.samples_per_epsilon * len(self.epsilons)
+        samples_per_second = completed / elapsed if elapsed > 0 else 0.0
+        done = self.samples.get(self.current_epsilon, 0)
+        return {
+            'elapsed_seconds': elapsed,
+            'completed_samples': completed,
+            'total_samples': total,
+            'samples_per_second': samples_per_second,
+            'eta_seconds': (total - completed) / samples_per_second if samples_per_second > 0 else float('inf'),
+            'epsilon': self.current_epsilon,
+            'epsilon_progress': {epsilon: count / self.samples_per_epsilon for epsilon, count in self.samples.items()},
+            'rejection_rates': {name: count / done if done > 0 else 0.0
+                                for name, count in self.rejections.get(self.current_epsilon, {}).items()}
+        }
+
+    def report(self) -> None:
+        state = self.get_state()
+        if self.callback is not None:
+            self.callback(state)
+        if self.printing:
+            finished_epsilons = sum(1 for fraction in state['epsilon_progress'].values() if fraction >= 1.0)
+            rates = ", ".join(name + ": " + format(rate, '.3f') for name, rate in state['rejection_rates'].items())
+            print("\rSamples " + str(state['completed_samples']) + "/" + str(state['total_samples'])
+                  + ", epsilon " + str(finished_epsilons) + "/" + str(len(self.epsilons))
+                  + " (epsilon=" + format(state['epsilon'], '.4f') + ": "
+                  + format(100 * state['epsilon_progress'].get(state['epsilon'], 0.0), '.0f') + " %), "
+                  + format(state['samples_per_second'], '.1f') + " samples/s, ETA "
+                  + format(state['eta_seconds'], '.0f') + " s, rejection rates: " + rates, end='', flush=True)
@@ -6,6 +6,9 @@ from typing import Callable, List
 
 # local file imports
 from simulation.piecewise_linear_function import PiecewiseLinearFunction
+from statistical_tests.empirical_process import EmpiricalDistributionFunction, UniformEmpiricalProcess
+
+SORT_FREE_MIN_N = 10 ** 6  # below, uniform values plus numpy's vectorized sort are faster than exponential spacings
 
 
 def get_distribution_function(list_of_points: List[List[float]]) -> PiecewiseLinearFunction:
@@ -21,11 +24,45 @@ def quantile_function(distribution_function: PiecewiseLinearFunction) -> Callabl
 def get_random_values(distribution_function: PiecewiseLinearFunction, size: int) -> np.array:
     """Inverse transform sampling: Returns a vector of random values which corresponds to the distribution."""
     uniform_distributed_values = np.random.uniform(size=size)
-    inverse = quantile_function(distribution_function)
-    result = []
-    for x in uniform_distributed_values:
-        result.append(inverse(x))
-    return np.array(result)
+    x, y = distribution_function.get_breakpoints()
+    return np.interp(uniform_distributed_values, y, x)  # the inverse for all values at once
+
+
+def get_sorted_uniform_values(size: int,
+                              rows: int = None,
+                              rng: np.random.Generator = None,
+                              out: np.array = None) -> np.array:
+    """Returns the order statistics of size uniformly distributed values, for each of rows vectors iff rows is given.
+    For size >= SORT_FREE_MIN_N, they are generated without sorting in O(size) as normalized cumulative sums of
+    size + 1 standard exponential spacings: (E_1 + ... + E_i) / (E_1 + ... + E_{size+1}) for i = 1, ..., size.
+    Uses the global numpy random state iff rng is None. The result is written into out, if given."""
+    shape = (size,) if rows is None else (rows, size)
+    if out is None:
+        out = np.empty(shape)
+    if size < SORT_FREE_MIN_N:
+        if rng is None:
+            out[...] = np.random.uniform(size=shape)
+        else:
+            rng.random(out=out, dtype=out.dtype)
+        out.sort(axis=-1)
+        return out
+
+    spacings_shape = shape[:-1] + (size + 1,)
+    spacings = np.random.standard_exponential(spacings_shape) if rng is None else rng.standard_exponential(
+        spacings_shape)
+    np.cumsum(spacings, axis=-1, out=spacings)  # in float64 also for float32 results, because the sums are long
+    np.divide(spacings[..., :size], spacings[..., size:], out=out)
+    return out
+
+
+def get_sorted_random_values(distribution_function: PiecewiseLinearFunction,
+                             size: int,
+                             rows: int = None,
+                             rng: np.random.Generator = None) -> np.array:
+    """Like get_random_values, but sorted: the inverse of the distribution function is monotone, so it maps the
+    sorted uniform values of get_sorted_uniform_values to sorted values. Pass them to the tests with presorted=True."""
+    x, y = distribution_function.get_breakpoints()
+    return np.interp(get_sorted_uniform_values(size, rows=rows, rng=rng), y, x)
 
 
 def get_cdf_uniform_with_eps_error(epsilon: float,
@@ -46,20 +83,14 @@ def get_cdf_uniform_with_eps_error(epsilon: float,
     return func
 
 
-def ecdf(data: np.array) -> Callable[[float], float]:
-    """Return empirical cumulative distribution function."""
-    sorted_data = np.sort(data)
-
-    def result(v: float) -> float:
-        return np.searchsorted(sorted_data, v, side='right') / data.size
-    return result
+def ecdf(data: np.array) -> EmpiricalDistributionFunction:
+    """Return empirical cumulative distribution function. It also accepts arrays, see empirical_process.py"""
+    return EmpiricalDistributionFunction(data)
 
 
-def uep(data: np.array) -> Callable[[float], float]:
+def uep(data: np.array) -> UniformEmpiricalProcess:
     """Return uniform empirical process."""
-    def result(v: float):
-        return sqrt(data.size) * (ecdf(data)(v) - v)
-    return result
+    return UniformEmpiricalProcess(data)
 
 
 def normal_cdf(x: float) -> float:
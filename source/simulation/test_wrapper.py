@@ -1,5 +1,7 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 
+import numpy as np
+
 # local file imports
 from statistical_tests.statistical_test import StatisticalTest
 
@@ -9,3 +11,9 @@ class WrappedStatisticalTest:
         self.test = test
         self.critical_value = critical_value
         self.empirical_probability_h0_dismissed = dict()
+        self.statistics = dict()  # epsilon -> the sorted simulated statistics
+
+    def get_empirical_probability_h0_dismissed(self, epsilon: float, critical_value: float) -> float:
+        """Returns the fraction of the simulated statistics for epsilon, which are greater than critical_value."""
+        statistics = self.statistics[epsilon]
+        return 1 - np.searchsorted(statistics, critical_value, side='right') / statistics.size
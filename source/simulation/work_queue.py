@@ -0,0 +1,287 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""A work queue in a shared directory (e.g. NFS), which distributes a simulation sweep over several machines.
+
+The coordinator splits the sweep over all n and epsilon into tasks of block_size vectors and writes them as files:
+
+    <directory>/sweep.json          the tests, critical values and distribution functions
+    <directory>/pending/<task>.json tasks (n, epsilon, number of vectors, seed), which nobody works on
+    <directory>/claimed/<task>.json tasks, which a worker works on; the modification time is the last heartbeat
+    <directory>/results/<task>.json the number of rejections of each test for the task
+
+A worker claims a task by renaming it from pending to claimed. A rename is atomic, so exactly one worker succeeds.
+While it works, a background thread touches the claimed file every lease_timeout / 3 seconds. Claimed tasks
+without a heartbeat for lease_timeout seconds are moved back to pending by reclaim_expired, so the tasks of dead
+workers are done by others. Each task has its own seed, so its result does not depend on the worker. Therefore, a
+task which is done twice (by a slow worker and after it was reclaimed) writes the same result twice, which is harmless.
+Results are written to a temporary file first and then renamed, so the coordinator never reads partial results.
+
+Start workers on any machine from the source directory:
+    python -m simulation.work_queue /shared/sweep --lease-timeout 60
+
+Example:
+    >>> queue = WorkQueue('/shared/sweep')
+    >>> queue.create_sweep([KsTest, LnTest], n_values=[100], epsilons=np.linspace(0, 0.05, 20), m=10 ** 5,
+    ...                    alpha=0.05, error_position=0.1)
+    >>> queue.wait()  # while the workers are running
+    >>> queue.get_rejection_rates()[100][0.05]['Kolmogorov Smirnov test']
+"""
+
+import argparse
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Union
+import numpy as np
+
+# local file imports
+from simulation.parallel_simulation import simulate_statistics
+from simulation.statistic_tools import get_cdf_uniform_with_eps_error
+
+SWEEP_FILENAME = 'sweep.json'
+DEFAULT_LEASE_TIMEOUT = 60.0  # seconds
+
+
+def get_worker_id() -> str:
+    return socket.gethostname() + '-' + str(os.getpid())
+
+
+def _write_json_atomically(filename: str, content: dict) -> None:
+    temporary_filename = filename + '.' + get_worker_id() + '.tmp'
+    with open(temporary_filename, 'w') as file:
+        json.dump(content, file)
+    os.replace(temporary_filename, filename)
+
+
+def _read_json(filename: str) -> Union[dict, None]:
+    """Returns None if the file does not exist (any more)."""
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def _get_test_class(path: str) -> type:
+    """Returns the class for 'module.ClassName'."""
+    module_name, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class Heartbeat:
+    """Touches a file every interval seconds in a background thread, until the with block ends or the file is gone."""
+    def __init__(self, filename: str, interval: float):
+        self.filename = filename
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+    def __enter__(self) -> 'Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def __run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                os.utime(self.filename)
+            except FileNotFoundError:
+                return  # the task was reclaimed
+
+
+class WorkQueue:
+    def __init__(self, directory: str, lease_timeout: float = DEFAULT_LEASE_TIMEOUT):
+        self.directory = directory
+        self.lease_timeout = lease_timeout
+        self.pending_directory = os.path.join(directory, 'pending')
+        self.claimed_directory = os.path.join(directory, 'claimed')
+        self.results_directory = os.path.join(directory, 'results')
+        self._sweep = None
+
+    @property
+    def sweep(self) -> dict:
+        if self._sweep is None:
+            self._sweep = _read_json(os.path.join(self.directory, SWEEP_FILENAME))
+            if self._sweep is None:
+                raise ValueError("there is no sweep in " + self.directory)
+        return self._sweep
+
+    def create_sweep(self,
+                     test_classes: List[type],
+                     n_values: List[int],
+                     epsilons: List[float],
+                     m: int,
+                     alpha: float,
+                     error_position: float,
+                     error_delta: float = 1.0,
+                     block_size: int = 1000,
+                     seed: int = None,
+                     epsilon: float = 0.0001,
+                     max_iter: int = 100) -> None:
+        """Writes the sweep and its tasks: m vectors of each length n for each epsilon, in blocks of block_size.
+        The critical values are calculated here once, so that all workers use the same. epsilon and max_iter are
+        passed to get_critical_value."""
+        if os.path.exists(os.path.join(self.directory, SWEEP_FILENAME)):
+            raise ValueError("there is already a sweep in " + self.directory)
+        for directory in [self.pending_directory, self.claimed_directory, self.results_directory]:
+            os.makedirs(directory, exist_ok=True)
+
+        tests = [test_class() for test_class in test_classes]
+        n_values = [int(n) for n in n_values]
+        critical_values = {str(n): [float(test.get_cached_critical_value(
+            alpha=alpha, epsilon=epsilon, max_iter=max_iter, n=test.get_critical_value_n(n))) for test in tests]
+            for n in n_values}
+        tasks = [(n, e, start, min(start + block_size, m))
+                 for n in n_values for e in range(len(epsilons)) for start in range(0, m, block_size)]
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(tasks))]
+
+        for index, ((n, e, start, stop), task_seed) in enumerate(zip(tasks, seeds)):
+            _write_json_atomically(os.path.join(self.pending_directory, self.get_task_filename(index)),
+                                   {'index': index, 'n': n, 'epsilon_index': e, 'size': stop - start,
+                                    'seed': task_seed})
+        self._sweep = {'tests': [test_class.__module__ + '.' + test_class.__name__ for test_class in test_classes],
+                       'test_names': [test.get_name() for test in tests],
+                       'n_values': n_values, 'epsilons': [float(e) for e in epsilons], 'm': m, 'alpha': alpha,
+                       'error_position': error_position, 'error_delta': error_delta,
+                       'critical_values': critical_values, 'number_of_tasks': len(tasks)}
+        _write_json_atomically(os.path.join(self.directory, SWEEP_FILENAME), self._sweep)  # last: the sweep is ready
+
+    @staticmethod
+    def get_task_filename(index: int) -> str:
+        return 'task_' + format(index, '07d') + '.json'
+
+    def claim(self) -> Union[dict, None]:
+        """Returns a pending task, which is now claimed by the caller, or None if there is none."""
+        for filename in sorted(os.listdir(self.pending_directory)):
+            if not filename.endswith('.json'):
+                continue
+            pending = os.path.join(self.pending_directory, filename)
+            claimed = os.path.join(self.claimed_directory, filename)
+            try:
+                # the lease starts before the rename, so reclaim_expired never sees a claimed task with an old time
+                os.utime(pending)
+                os.rename(pending, claimed)
+            except FileNotFoundError:
+                continue  # another worker was faster
+            if os.path.exists(os.path.join(self.results_directory, filename)):
+                self.__remove(claimed)  # it was reclaimed from a slow worker, which finished it anyway
+                continue
+            return _read_json(claimed)
+        return None
+
+    def complete(self, task: dict, rejections: List[int]) -> None:
+        filename = self.get_task_filename(task['index'])
+        _write_json_atomically(os.path.join(self.results_directory, filename),
+                               {'index': task['index'], 'n': task['n'], 'epsilon_index': task['epsilon_index'],
+                                'size': task['size'], 'rejections': rejections, 'worker': get_worker_id()})
+        self.__remove(os.path.join(self.claimed_directory, filename))
+
+    def reclaim_expired(self) -> int:
+        """Moves the claimed tasks without heartbeat for lease_timeout seconds back to pending.
+        Returns their number."""
+        number = 0
+        now = time.time()
+        for filename in os.listdir(self.claimed_directory):
+            claimed = os.path.join(self.claimed_directory, filename)
+            try:
+                if now - os.stat(claimed).st_mtime < self.lease_timeout:
+                    continue
+                if os.path.exists(os.path.join(self.results_directory, filename)):
+                    self.__remove(claimed)
+                    continue
+                os.rename(claimed, os.path.join(self.pending_directory, filename))
+                number += 1
+            except FileNotFoundError:
+                continue  # the task was completed or reclaimed meanwhile
+        return number
+
+    @staticmethod
+    def __remove(filename: str) -> None:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+    def run_task(self, task: dict) -> List[int]:
+        """Returns the number of rejections of each test for the vectors of the task."""
+        sweep = self.sweep
+        cdf = get_cdf_uniform_with_eps_error(epsilon=sweep['epsilons'][task['epsilon_index']],
+                                             error_position=sweep['error_position'], delta=sweep['error_delta'])
+        statistics = simulate_statistics([_get_test_class(path) for path in sweep['tests']], [cdf], task['n'],
+                                         task['size'], processes=1, seed=task['seed'])[0]
+        critical_values = np.array(sweep['critical_values'][str(task['n'])])[:, np.newaxis]
+        return [int(r) for r in np.sum(statistics > critical_values, axis=-1)]
+
+    def work(self, stop_when_empty: bool = True, poll_interval: float = 1.0) -> int:
+        """Claims and runs tasks until there are no more (or forever iff not stop_when_empty).
+        Returns the number of completed tasks. Raises ValueError if the coordinator has not created the sweep yet."""
+        if not os.path.exists(os.path.join(self.directory, SWEEP_FILENAME)):
+            raise ValueError("there is no sweep in " + self.directory)  # the tasks are complete as soon as it exists
+        completed = 0
+        while True:
+            self.reclaim_expired()
+            task = self.claim()
+            if task is None:
+                if stop_when_empty and self.is_finished():
+                    return completed
+                time.sleep(poll_interval)  # others are still working and might die
+                continue
+            claimed = os.path.join(self.claimed_directory, self.get_task_filename(task['index']))
+            with Heartbeat(claimed, self.lease_timeout / 3):
+                rejections = self.run_task(task)
+            self.complete(task, rejections)
+            completed += 1
+
+    def get_number_of_results(self) -> int:
+        return sum(1 for filename in os.listdir(self.results_directory) if filename.endswith('.json'))
+
+    def is_finished(self) -> bool:
+        return self.get_number_of_results() == self.sweep['number_of_tasks']
+
+    def wait(self, poll_interval: float = 1.0, timeout: float = None) -> None:
+        """Waits until all tasks are done and reclaims expired tasks meanwhile. Raises TimeoutError."""
+        start = time.time()
+        while not self.is_finished():
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(str(self.get_number_of_results()) + " of " + str(self.sweep['number_of_tasks'])
+                                   + " tasks are done")
+            self.reclaim_expired()
+            time.sleep(poll_interval)
+
+    def get_rejection_rates(self) -> Dict[int, Dict[float, Dict[str, float]]]:
+        """Merges the results: returns the empirical probability of dismissing H0 for each n, epsilon and test name."""
+        sweep = self.sweep
+        rejections = {n: np.zeros((len(sweep['epsilons']), len(sweep['tests'])), dtype=np.int64)
+                      for n in sweep['n_values']}
+        samples = {n: np.zeros(len(sweep['epsilons']), dtype=np.int64) for n in sweep['n_values']}
+        for filename in os.listdir(self.pending_directory) + os.listdir(self.claimed_directory):
+            if filename.endswith('.json') and not os.path.exists(os.path.join(self.results_directory, filename)):
+                raise ValueError("the sweep is not finished yet")
+        for filename in os.listdir(self.results_directory):
+            if not filename.endswith('.json'):
+                continue
+            result = _read_json(os.path.join(self.results_directory, filename))
+            rejections[result['n']][result['epsilon_index']] += result['rejections']
+            samples[result['n']][result['epsilon_index']] += result['size']
+
+        return {n: {epsilon: {name: float(rejections[n][e, t] / samples[n][e])
+                              for t, name in enumerate(sweep['test_names'])}
+                    for e, epsilon in enumerate(sweep['epsilons'])}
+                for n in sweep['n_values']}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker for a simulation sweep in a shared directory")
+    parser.add_argument('directory')
+    parser.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT,
+                        help="seconds without heartbeat, after which tasks are reclaimed (default: 60)")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.directory, lease_timeout=args.lease_timeout)
+    print(get_worker_id() + " completed " + str(queue.work(poll_interval=args.poll_interval)) + " tasks")
@@ -0,0 +1,85 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Tests many data sets with many tests and significance levels at once."""
+
+from typing import List, Union
+import numpy as np
+
+# local file imports
+from statistical_tests.statistical_test import StatisticalTest
+from statistical_tests.sorted_sample import SortedSample
+from statistical_tests.null_distribution import get_null_distribution
+
+RESULT_DTYPE = np.dtype([
+    ('dataset', np.int64),
+    ('n', np.int64),
+    ('test', 'U40'),
+    ('alpha', np.float64),
+    ('statistic', np.float64),
+    ('critical_value', np.float64),
+    ('p_value', np.float64),
+    ('dismissed', np.bool_)
+])
+
+
+def evaluate_datasets(datasets: List[Union[np.array, List[float]]],
+                      tests: List[StatisticalTest],
+                      alphas: List[float],
+                      with_p_values: bool = True,
+                      number_of_samples: int = 10 ** 4,
+                      printing: bool = False
+                      ) -> np.ndarray:
+    """Returns a structured array (see RESULT_DTYPE) with one row for each data set, test and alpha, in this order.
+    The data sets may have different lengths. Data sets of the same length are stacked into one matrix, which is
+    sorted once and evaluated by all tests at once. Critical values and null distributions are looked up only once
+    for each test, alpha and length. The field p_value is nan iff with_p_values is False.
+
+    Example:
+        >>> data = [[0.1, 0.5, 0.7], np.random.uniform(size=100)]
+        >>> result = evaluate_datasets(data, [KsTest(), LnTest()], alphas=[0.05, 0.1])
+        >>> result[result['dismissed']]['dataset']
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    result = np.zeros(len(datasets) * len(tests) * alphas.size, dtype=RESULT_DTYPE)
+    result = result.reshape((len(datasets), len(tests), alphas.size))
+
+    indices_by_length = {}
+    for i, data in enumerate(datasets):
+        indices_by_length.setdefault(np.size(data), []).append(i)
+
+    for n, indices in indices_by_length.items():
+        if n == 0:
+            raise ValueError("there is no data in data set " + str(indices[0]))
+        sample = SortedSample(np.array([np.asarray(datasets[i], dtype=np.float64) for i in indices]),
+                              sort_in_place=True)
+
+        for t, test in enumerate(tests):
+            previous = test._data, test._sample, test.n  # the sample setter would replace the data by the sorted data
+            test.sample = sample
+            try:
+                statistics = test.get_statistic()
+            finally:
+                test._data, test._sample, test.n = previous  # the tests of the caller keep their own data
+            p_values = np.nan
+            if with_p_values:
+                p_values = get_null_distribution(test, n, number_of_samples).p_value(statistics)
+
+            for a, alpha in enumerate(alphas):
+                critical_value = test.get_cached_critical_value(alpha=alpha, n=test.get_critical_value_n(n))
+                rows = result[indices, t, a]
+                rows['dataset'] = indices
+                rows['n'] = n
+                rows['test'] = test.get_name()
+                rows['alpha'] = alpha
+                rows['statistic'] = statistics
+                rows['critical_value'] = critical_value
+                rows['p_value'] = p_values
+                rows['dismissed'] = statistics > critical_value
+                result[indices, t, a] = rows
+
+    result = result.reshape(-1)
+    if printing:
+        for row in result:
+            print("data set " + str(row['dataset']) + ", " + row['test'] + ", alpha=" + str(row['alpha']) + ": H0 "
+                  + ("dismissed" if row['dismissed'] else "accepted") + ", Tn = " + str(row['statistic'])
+                  + ", c_alpha = " + str(row['critical_value']) + ", p-value = " + str(row['p_value']))
+    return result
@@ -0,0 +1,166 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Piecewise Chebyshev approximations of the limiting distribution functions and their densities.
+
+The series of the distribution functions need hundreds of exponential or error functions per point. A
+ChebyshevSurrogate needs one binary search and degree multiply-adds (Clenshaw's algorithm) per point instead.
+It is built once for each test and max_iter and saved in the quantile_tables directory. The file name contains
+SURROGATE_VERSION and DEGREE, so a surrogate built by other code is rebuilt instead of trusted.
+
+Construction: outside of [x_min, x_max], the distribution function differs from 0 and 1 by less than tolerance / 2.
+This interval is split until the interpolant at the Chebyshev points of each piece differs from the reference series
+by less than tolerance / 2 at VERIFICATION_POINTS points per piece, which are much denser than the Chebyshev points.
+The largest difference is stored as max_error. The density is the exact derivative of the approximation; its error
+is measured against central differences of the reference and stored as max_density_error.
+
+Example:
+    >>> cdf = get_cdf_surrogate(KsTest(), max_iter=100)
+    >>> cdf(np.linspace(0.0, 3.0, 10 ** 6)), cdf.density(1.0), cdf.max_error
+"""
+
+import os
+from typing import Callable, Union
+import numpy as np
+from numpy.polynomial import chebyshev
+
+SURROGATE_DIRECTORY = 'quantile_tables'
+DEFAULT_TOLERANCE = 1e-10
+DEGREE = 16
+VERIFICATION_POINTS = 8 * (DEGREE + 1)
+SEARCH_LIMIT = 50.0  # the support is searched in [0, SEARCH_LIMIT]
+BUILD_SURROGATES = True  # False in worker processes, which only load the surrogates built by the main process
+# part of the file names together with DEGREE, so that surrogates built by older code are never loaded.
+# Increase it whenever build, _evaluate or the series of the distribution functions change.
+SURROGATE_VERSION = 1
+
+
+class ChebyshevSurrogate:
+    """coefficients[i] are the Chebyshev coefficients of the distribution function on [edges[i], edges[i + 1]]."""
+    def __init__(self, edges: np.array, coefficients: np.array, max_error: float, max_density_error: float = np.nan):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.max_error = float(max_error)
+        self.max_density_error = float(max_density_error)
+        widths = np.diff(self.edges)[:, np.newaxis]
+        self.density_coefficients = chebyshev.chebder(self.coefficients, axis=1) * 2 / widths
+
+    @property
+    def support(self) -> (float, float):
+        return self.edges[0], self.edges[-1]
+
+    def __call__(self, x: Union[float, np.array]) -> Union[float, np.array]:
+        """Returns the approximated distribution function, which also accepts arrays."""
+        values = self._evaluate(self.coefficients, x, lower=0.0, upper=1.0)
+        return np.clip(values, 0.0, 1.0)[()]
+
+    def density(self, x: Union[float, np.array]) -> Union[float, np.array]:
+        return np.maximum(self._evaluate(self.density_coefficients, x, lower=0.0, upper=0.0), 0.0)[()]
+
+    def _evaluate(self, coefficients: np.array, x: Union[float, np.array], lower: float, upper: float) -> np.array:
+        """Clenshaw's algorithm for all points at once, each with the coefficients of its piece."""
+        x = np.asarray(x, dtype=np.float64)
+        piece = np.clip(np.searchsorted(self.edges, x, side='right') - 1, 0, self.edges.size - 2)
+        a, b = self.edges[piece], self.edges[piece + 1]
+        t = (2 * x - a - b) / (b - a)
+        c = coefficients[piece]
+
+        b1 = np.zeros(x.shape)
+        b2 = np.zeros(x.shape)
+        for k in range(c.shape[-1] - 1, 0, -1):
+            b1, b2 = c[..., k] + 2 * t * b1 - b2, b1
+        result = c[..., 0] + t * b1 - b2
+        return np.where(x < self.edges[0], lower, np.where(x > self.edges[-1], upper, result))
+
+    @staticmethod
+    def build(cdf: Callable[[np.array], np.array], tolerance: float = DEFAULT_TOLERANCE) -> 'ChebyshevSurrogate':
+        """cdf must accept arrays. Raises ValueError if the tolerance cannot be reached."""
+        grid = np.linspace(0.0, SEARCH_LIMIT, 50001)
+        values = cdf(grid)
+        below = np.flatnonzero(values < tolerance / 2)
+        above = np.flatnonzero(1 - values < tolerance / 2)
+        if above.size == 0:
+            raise ValueError("the distribution function does not reach 1 in [0, " + str(SEARCH_LIMIT) + "]")
+        x_max = grid[above[0]]
+        x_min = grid[below[below < above[0]][-1]] if np.any(below < above[0]) else 0.0
+
+        edges = [x_min]
+        coefficients = []
+        max_error = 0.0
+        pieces = [(x_min, x_max)]
+        while pieces:
+            a, b = pieces.pop()
+            if b - a < 1e-8:
+                raise ValueError("tolerance " + str(tolerance) + " cannot be reached near x=" + str(a))
+            c = chebyshev.chebinterpolate(lambda t: cdf(a + (t + 1) * (b - a) / 2), DEGREE)
+            t = np.linspace(-1.0, 1.0, VERIFICATION_POINTS)
+            error = np.max(np.abs(chebyshev.chebval(t, c) - cdf(a + (t + 1) * (b - a) / 2)))
+            if error < tolerance / 2:
+                edges.append(b)
+                coefficients.append(c)
+                max_error = max(max_error, error)
+            else:
+                middle = (a + b) / 2
+                pieces += [(middle, b), (a, middle)]  # the left piece is processed first
+
+        surrogate = ChebyshevSurrogate(np.array(edges), np.array(coefficients), max_error + tolerance / 2)
+        surrogate.max_density_error = surrogate._get_density_error(cdf)
+        return surrogate
+
+    def _get_density_error(self, cdf: Callable[[np.array], np.array], h: float = 1e-5) -> float:
+        x = np.linspace(self.edges[0] + h, self.edges[-1] - h, 10 ** 4)
+        reference = (cdf(x + h) - cdf(x - h)) / (2 * h)
+        return float(np.max(np.abs(self.density(x) - reference)))
+
+    def save(self, filename: str) -> None:
+        """Writes to a temporary file first, so other processes never read a partially written file."""
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filename, 'wb') as file:
+            np.savez(file, edges=self.edges, coefficients=self.coefficients, max_error=self.max_error,
+                     max_density_error=self.max_density_error)
+        os.replace(temporary_filename, filename)
+
+    @staticmethod
+    def load(filename: str) -> Union['ChebyshevSurrogate', None]:
+        """Return None if there is no such file."""
+        if not os.path.isfile(filename):
+            return None
+        with np.load(filename) as data:
+            return ChebyshevSurrogate(data['edges'], data['coefficients'], data['max_error'],
+                                      data['max_density_error'])
+
+
+def get_filename(test_name: str, max_iter: int) -> str:
+    return os.path.join(SURROGATE_DIRECTORY, test_name.strip() + " surrogate v" + str(SURROGATE_VERSION) + " degree="
+                        + str(DEGREE) + " max_iter=" + str(max_iter) + ".npz")
+
+
+_surrogates = {}  # in-process cache: (test name, max_iter) -> ChebyshevSurrogate
+_unreachable = set()  # (test name, max_iter, tolerance) for which the build failed, so it is not tried again
+
+
+def get_cdf_surrogate(test, max_iter: int, tolerance: float = DEFAULT_TOLERANCE) -> ChebyshevSurrogate:
+    """Returns the approximation of test.get_cdf(max_iter) with max_error <= tolerance.
+    It is loaded from disk, or built and saved iff there is none with at least that precision.
+    Raises ValueError if the tolerance cannot be reached, e.g. because the series with few iterations does not
+    reach 1, and if there is no such surrogate on disk and BUILD_SURROGATES is False."""
+    key = (test.get_name(), max_iter)
+    surrogate = _surrogates.get(key)
+    if surrogate is None or surrogate.max_error > tolerance:
+        filename = get_filename(test.get_name(), max_iter)
+        surrogate = ChebyshevSurrogate.load(filename)
+        if surrogate is None or surrogate.max_error > tolerance:
+            if not BUILD_SURROGATES:
+                raise ValueError("there is no surrogate with max_error <= " + str(tolerance) + " in " + filename)
+            if key + (tolerance,) in _unreachable:
+                raise ValueError("tolerance " + str(tolerance) + " cannot be reached for max_iter=" + str(max_iter))
+            reference = test.get_cdf(max_iter)
+            try:
+                surrogate = ChebyshevSurrogate.build(np.vectorize(reference, otypes=[np.float64]), tolerance)
+            except ValueError:
+                _unreachable.add(key + (tolerance,))
+                raise
+            surrogate.save(filename)
+        _surrogates[key] = surrogate
+    return surrogate
@@ -0,0 +1,118 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Memoizes critical values in memory and on disk, shared by all test instances and processes."""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Tuple, Union
+
+CRITICAL_VALUE_CACHE_FILENAME = os.path.join('quantile_tables', 'critical values.csv')
+
+Key = Tuple[str, str, float, int, float, int]  # test name, method, alpha, n, epsilon, max_iter
+
+
+class CriticalValueCache:
+    """A least recently used memo in front of a small CSV file.
+    Each new value is written through to the file, so other processes and later runs find it as well.
+    The file is re-read only when it was modified by someone else.
+    The keys contain the method of the test (see StatisticalTest.get_critical_value_method), so values of an older
+    method are never returned. Entries of files without a method column are dropped."""
+    def __init__(self, filename: str = CRITICAL_VALUE_CACHE_FILENAME, maxsize: int = 1024):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.separator = ';'
+        self._memo = OrderedDict()
+        self._disk_entries = {}
+        self._disk_modification_time = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(test_name: str, method: str, alpha: float, n: int, epsilon: float, max_iter: int) -> Key:
+        return test_name, method, round(float(alpha), 10), int(n), float(epsilon), int(max_iter)
+
+    def get(self, key: Key) -> Union[float, None]:
+        """Return None if the value is neither in memory nor on disk."""
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+
+            self.__reload_if_modified()
+            value = self._disk_entries.get(key)
+            if value is not None:
+                self.__remember(key, value)
+            return value
+
+    def put(self, key: Key, value: float) -> None:
+        value = float(value)
+        with self._lock:
+            self.__remember(key, value)
+            self.__reload_if_modified()
+            self._disk_entries[key] = value
+            self.__save()
+
+    def get_or_compute(self, key: Key, compute: Callable[[], float]) -> float:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear_memo(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+    def set_filename(self, filename: str) -> None:
+        """Forgets all values and uses the given file from now on, e.g. a temporary one in the unit tests."""
+        with self._lock:
+            self.filename = filename
+            self._memo.clear()
+            self._disk_entries = {}
+            self._disk_modification_time = None
+
+    def __remember(self, key: Key, value: float) -> None:
+        self._memo[key] = value
+        self._memo.move_to_end(key)
+        if len(self._memo) > self.maxsize:
+            self._memo.popitem(last=False)
+
+    def __reload_if_modified(self) -> None:
+        try:
+            modification_time = os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return  # there is no file yet
+        if modification_time == self._disk_modification_time:
+            return
+
+        try:
+            with open(self.filename, 'r') as file:
+                lines = file.readlines()
+            if lines and 'method' in lines[0].strip().split(self.separator):
+                for line in lines[1:]:
+                    s = line.strip().split(self.separator)
+                    key = self.get_key(s[0], s[1], float(s[2]), int(s[3]), float(s[4]), int(s[5]))
+                    self._disk_entries[key] = float(s[6])
+            self._disk_modification_time = modification_time
+        except Exception as e:
+            print(e)
+
+    def __save(self) -> None:
+        """Writes to a temporary file first, so readers never see a partially written file."""
+        temporary_filename = self.filename + '.' + str(os.getpid()) + '.tmp'
+        try:
+            directory = os.path.dirname(self.filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temporary_filename, 'w') as file:
+                s = self.separator
+                file.write('test' + s + 'method' + s + 'alpha' + s + 'n' + s + 'epsilon' + s + 'max_iter' + s
+                           + 'value\n')
+                for key, value in sorted(self._disk_entries.items()):
+                    file.write(s.join(str(x) for x in key) + s + repr(value) + '\n')
+            os.replace(temporary_filename, self.filename)
+            self._disk_modification_time = os.stat(self.filename).st_mtime_ns
+        except Exception as e:
+            print(e)
+
+
+critical_value_cache = CriticalValueCache()  # shared by all statistical tests
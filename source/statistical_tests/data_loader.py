@@ -0,0 +1,94 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Load large data vectors from files without creating Python lists."""
+
+import os
+from typing import Union
+import numpy as np
+
+FLOAT_TYPES = (np.dtype(np.float64), np.dtype(np.float32))
+
+
+def load_binary(filename: str,
+                dtype: Union[str, np.dtype] = np.float64,
+                offset: int = 0,
+                writable: bool = False
+                ) -> np.ndarray:
+    """Memory-maps a raw binary file of float64 or float32 values.
+
+    Parameters:
+        filename (str): The file with the raw values (native byte order, no header).
+        dtype: Either float64 or float32.
+        offset (int): Number of bytes to skip at the beginning of the file.
+        writable (bool): Maps the file copy-on-write iff True. This is necessary for sorting in place.
+            The file itself is never modified.
+
+    Example:
+        >>> test = KsTest(data_vector=load_binary("my_data.f64", writable=True), sort_in_place=True)
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in FLOAT_TYPES:
+        raise ValueError("dtype must be float64 or float32")
+    return np.memmap(filename, dtype=dtype, mode='c' if writable else 'r', offset=offset)
+
+
+def load_npy(filename: str, writable: bool = False) -> np.ndarray:
+    """Memory-maps a one-dimensional .npy file. See load_binary for the parameter writable."""
+    data = np.load(filename, mmap_mode='c' if writable else 'r')
+    if data.ndim != 1:
+        raise ValueError("the file must contain a one-dimensional array")
+    return data
+
+
+def load_text(filename: str,
+              column: int = 0,
+              separator: str = None,
+              skip_header: int = 0,
+              chunk_size: int = 10 ** 5,
+              dtype: Union[str, np.dtype] = np.float64
+              ) -> np.ndarray:
+    """Reads one column of a CSV or text file chunk by chunk into a pre-sized array.
+    The file is read twice: once for counting the lines and once for parsing them.
+    Decimal commas are accepted unless the separator is a comma itself. Empty lines are skipped.
+
+    Example:
+        >>> load_text("my_data.csv", column=1, separator=';', skip_header=1)
+    """
+    with open(filename, 'r') as file:
+        size = sum(1 for i, line in enumerate(file) if i >= skip_header and line.strip())
+
+    result = np.empty(size, dtype=dtype)
+    position = 0
+    chunk = []
+    with open(filename, 'r') as file:
+        for i, line in enumerate(file):
+            line = line.strip()
+            if i < skip_header or not line:
+                continue
+
+            value = line.split(separator)[column].strip()
+            chunk.append(value if separator == ',' else value.replace(',', '.'))
+
+            if len(chunk) == chunk_size:
+                result[position:position + len(chunk)] = np.asarray(chunk, dtype=np.float64)
+                position += len(chunk)
+                chunk = []
+    result[position:position + len(chunk)] = np.asarray(chunk, dtype=np.float64)
+    return result
+
+
+def load_data(filename: str, writable: bool = False, **kwargs) -> np.ndarray:
+    """Chooses the loader by the file extension:
+    .npy files and raw binary files (.f64, .f32, .bin, .raw) are memory-mapped, everything else is read as text.
+    Additional keyword arguments are passed to the loader. Raises TypeError for .npy files, because load_npy has
+    none."""
+    extension = os.path.splitext(filename)[1].lower()
+
+    if extension == '.npy':
+        if kwargs:
+            raise TypeError("unsupported keyword arguments for .npy files: " + ", ".join(kwargs))
+        return load_npy(filename, writable=writable)
+    if extension == '.f32':
+        return load_binary(filename, dtype=np.float32, writable=writable, **kwargs)
+    if extension in ('.f64', '.bin', '.raw'):
+        return load_binary(filename, writable=writable, **kwargs)
+    return load_text(filename, **kwargs)
@@ -0,0 +1,74 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""The empirical distribution function and the uniform empirical process as callable objects.
+
+The data is sorted only once. Each evaluation is a single np.searchsorted, so the objects accept scalars as well as
+arrays of evaluation points. get_breakpoints returns the exact graph for plotting.
+
+Example:
+    >>> uep = UniformEmpiricalProcess(np.random.uniform(size=1000))
+    >>> uep(np.linspace(0.0, 1.0, 5000))
+    >>> x, y = uep.get_breakpoints()  # plt.plot(x, y) shows all jumps exactly
+"""
+
+from math import sqrt
+from typing import Tuple, Union
+import numpy as np
+
+
+class EmpiricalDistributionFunction:
+    """F_n(x) = #{i: x_i <= x} / n"""
+    def __init__(self, data: np.array, is_sorted: bool = False):
+        data = np.asarray(data, dtype=np.float64)
+        if data.size == 0:
+            raise ValueError("there is no data")
+        if data.ndim != 1:
+            raise ValueError("data must be one-dimensional")
+
+        self.data_sorted = data if is_sorted else np.sort(data)
+        self.n = data.size
+
+    def __call__(self, x: Union[float, np.array]) -> Union[float, np.array]:
+        return self._transform(np.searchsorted(self.data_sorted, x, side='right') / self.n, x)
+
+    def left_limit(self, x: Union[float, np.array]) -> Union[float, np.array]:
+        """Returns the limit from the left, which differs from the value only at the data points."""
+        return self._transform(np.searchsorted(self.data_sorted, x, side='left') / self.n, x)
+
+    def _transform(self, ecdf_values: Union[float, np.array], x: Union[float, np.array]) -> Union[float, np.array]:
+        """Maps F_n(x) to the value of the function. Must be affine linear in x between two data points."""
+        return ecdf_values
+
+    def _get_kinks(self, x_min: float, x_max: float) -> np.array:
+        """Returns the points between the data points, at which the function is not linear."""
+        return np.empty(0)
+
+    def get_breakpoints(self, x_min: float = 0.0, x_max: float = 1.0) -> Tuple[np.array, np.array]:
+        """Returns (x, y), such that the straight lines through the points are exactly the graph on [x_min, x_max].
+        Each data point appears twice, first with the limit from the left and then with the value."""
+        jumps = np.unique(self.data_sorted[(self.data_sorted > x_min) & (self.data_sorted < x_max)])
+        kinks = self._get_kinks(x_min, x_max)
+
+        x = np.concatenate(([x_min], jumps, kinks, jumps, [x_max]))
+        y = np.concatenate(([self(x_min)], self.left_limit(jumps), self(kinks), self(jumps), [self(x_max)]))
+        # at equal x: left limit first, then kinks, then the value
+        kind = np.concatenate(([0], np.zeros(jumps.size), np.ones(kinks.size), np.full(jumps.size, 2), [2]))
+        order = np.lexsort((kind, x))
+        return x[order], y[order]
+
+
+class UniformEmpiricalProcess(EmpiricalDistributionFunction):
+    """U_n(x) = sqrt(n) * (F_n(x) - x), or its absolute value iff absolute."""
+    def __init__(self, data: np.array, is_sorted: bool = False, absolute: bool = False):
+        super().__init__(data, is_sorted=is_sorted)
+        self.absolute = absolute
+
+    def _transform(self, ecdf_values: Union[float, np.array], x: Union[float, np.array]) -> Union[float, np.array]:
+        result = sqrt(self.n) * (ecdf_values - x)
+        return np.abs(result) if self.absolute else result
+
+    def _get_kinks(self, x_min: float, x_max: float) -> np.array:
+        """|U_n| has a kink where U_n crosses zero, i.e. at x = F_n(x). So only x = k / n are candidates."""
+        if not self.absolute:
+            return np.empty(0)
+        candidates = np.arange(self.n + 1) / self.n
+        return candidates[(candidates > x_min) & (candidates < x_max)]
@@ -0,0 +1,204 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Kernels for the hot loops: the extrema of the uniform empirical process and the series of the distribution
+functions of the Kolmogorov Smirnov test and the Ln test.
+
+If numba is installed, compiled kernels are used, which need a single pass without intermediate arrays.
+Otherwise, the same quantities are computed with NumPy. The backend can be chosen at runtime with set_backend.
+numba is imported on first use only, because importing it takes a while.
+"""
+
+import importlib.util
+import math
+from functools import lru_cache
+from typing import Dict, Tuple, Union
+import numpy as np
+
+BACKENDS = ('numba', 'numpy')
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+CHUNK_SIZE = 10 ** 6  # maximum number of elements of intermediate arrays of the NumPy backend
+
+_backend = 'numba' if NUMBA_AVAILABLE else 'numpy'
+_compiled = {}
+
+UEP_EXTREMA_KEYS = ('uep_max', 'uep_abs_max', 'weighted_uep_max', 'weighted_uep_abs_max')
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(backend: str) -> None:
+    """Chooses the backend 'numba' or 'numpy'."""
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of " + str(BACKENDS))
+    if backend == 'numba' and not NUMBA_AVAILABLE:
+        raise ValueError("numba is not installed")
+    _backend = backend
+
+
+def _get_compiled(name: str):
+    if not _compiled:
+        import numba
+        _compiled['uep_extrema'] = numba.njit(cache=True)(_uep_extrema_loop)
+        _compiled['ks_cdf'] = numba.njit(cache=True)(_ks_cdf_loop)
+        _compiled['ln_cdf'] = numba.njit(cache=True)(_ln_cdf_loop)
+    return _compiled[name]
+
+
+def _uep_extrema_loop(x: np.array, argmax: np.array, maximum: np.array) -> None:
+    """Compiled by numba. For each row of x (sorted), writes the argmax and maximum of F_n - id, |F_n - id| and
+    both divided by sqrt(t(1-t)) into argmax and maximum. Ties are handled as one jump of F_n."""
+    m, n = x.shape
+    for r in range(m):
+        for e in range(4):
+            maximum[r, e] = -np.inf
+        i = 0
+        while i < n:
+            t = x[r, i]
+            j = i
+            while j + 1 < n and x[r, j + 1] == t:
+                j += 1
+            upper = (j + 1) / n - t  # F_n(t) - t
+            lower = i / n - t  # F_n(t-) - t
+            absolute = max(upper, -lower)
+            weight = 1.0 / math.sqrt(t * (1.0 - t)) if 0.0 < t < 1.0 else 0.0
+
+            values = (upper, absolute, upper * weight, absolute * weight)
+            for e in range(4):
+                if values[e] > maximum[r, e]:
+                    maximum[r, e] = values[e]
+                    argmax[r, e] = t
+            i = j + 1
+
+
+def uep_extrema(data_sorted: np.array) -> Dict[str, Tuple[Union[float, np.array], Union[float, np.array]]]:
+    """Returns argmax and maximum of U_n, |U_n|, U_n(t)/sqrt(t(1-t)) and |U_n(t)|/sqrt(t(1-t)) in one pass with
+    the compiled kernel. The keys are UEP_EXTREMA_KEYS. The data is a vector or a matrix with one sample per row.
+    float32 data is not copied: numba compiles the kernel for each dtype."""
+    x = np.ascontiguousarray(data_sorted)
+    if x.dtype not in (np.float32, np.float64):
+        x = x.astype(np.float64)
+    rows = x.reshape((-1, x.shape[-1]))
+    argmax = np.empty((rows.shape[0], 4))
+    maximum = np.empty((rows.shape[0], 4))
+    _get_compiled('uep_extrema')(rows, argmax, maximum)
+    maximum *= np.sqrt(x.shape[-1])
+
+    result = {}
+    for e, key in enumerate(UEP_EXTREMA_KEYS):
+        result[key] = (argmax[:, e].reshape(x.shape[:-1])[()], maximum[:, e].reshape(x.shape[:-1])[()])
+    return result
+
+
+def _ks_cdf_loop(x: np.array, max_iter: int, out: np.array) -> None:
+    """Compiled by numba. The terms are decreasing, so the sum stops as soon as they are zero."""
+    for p in range(x.size):
+        if x[p] <= 0.0:
+            out[p] = 0.0
+            continue
+        c = math.pi * math.pi / (8 * x[p] * x[p])
+        res = 0.0
+        for k in range(1, max_iter + 1):
+            a = 2 * k - 1
+            term = math.exp(-a * a * c)
+            if term == 0.0:
+                break
+            res += term
+        out[p] = math.sqrt(2 * math.pi) / x[p] * res
+
+
+def ks_cdf(x: Union[float, np.array], max_iter: int) -> Union[float, np.array]:
+    """Kolmogorov distribution function. See KsTest.get_cdf"""
+    points = np.atleast_1d(np.asarray(x, dtype=np.float64)).ravel()
+    out = np.zeros(points.size)
+
+    if _backend == 'numba':
+        _get_compiled('ks_cdf')(points, max_iter, out)
+    else:
+        a = 2 * np.arange(1, max_iter + 1) - 1
+        coefficients = a * a * math.pi * math.pi / 8
+        positive = np.flatnonzero(points > 0)
+        for chunk in np.array_split(positive, max(1, positive.size * max_iter // CHUNK_SIZE)):
+            exponents = np.multiply.outer(1 / (points[chunk] * points[chunk]), coefficients)
+            out[chunk] = math.sqrt(2 * math.pi) / points[chunk] * np.exp(-exponents).sum(axis=1)
+    return out.reshape(np.shape(x))[()]
+
+
+@lru_cache(maxsize=None)
+def get_ln_cdf_weights(max_iter: int) -> np.array:
+    """Returns the weights w_k = H(max_iter - k) - H(max_iter + k + 1) for k = 0, ..., max_iter, where
+    H(N) = sum_{i=1}^{N} (-1)^i / i. With a_k = 2k + 1, the double sum in theorem 2.2.15 in master_thesis.pdf
+    collapses by partial fractions to
+        F(x) = 4 * sum_{k=0}^{max_iter} w_k * (Phi(a_k x) - 1/2) - x * phi(a_k x),
+    so each evaluation needs O(max_iter) instead of O(max_iter^2) operations."""
+    i = np.arange(1, 2 * max_iter + 2)
+    h = np.concatenate(([0.0], np.cumsum((-1.0) ** i / i)))
+    k = np.arange(max_iter + 1)
+    return h[max_iter - k] - h[max_iter + k + 1]
+
+
+def _ln_cdf_loop(x: np.array, weights: np.array, out: np.array) -> None:
+    """Compiled by numba. See get_ln_cdf_weights"""
+    for p in range(x.size):
+        if x[p] <= 0.0:
+            out[p] = 0.0
+            continue
+        res = 0.0
+        for k in range(weights.size):
+            ax = (2 * k + 1) * x[p]
+            res += weights[k] * 0.5 * math.erf(ax / math.sqrt(2.0)) \
+                - x[p] * math.exp(-0.5 * ax * ax) / math.sqrt(2 * math.pi)
+        out[p] = min(1.0, max(0.0, 4 * res))  # fix numerical errors
+
+
+ERF_SERIES_LIMIT = 2.5  # _erf uses the series below and the continued fraction above this value
+ERF_SERIES_TERMS = 40
+ERF_FRACTION_TERMS = 30
+ERF_ONE = 6.0  # 1 - erf(x) < 2.2e-17 for x >= 6
+
+
+def _erf(x: np.array) -> np.array:
+    """Vectorized error function, because NumPy has none. It agrees with math.erf up to 2e-15 by
+        erf(x) = 2 / sqrt(pi) * exp(-x^2) * sum_{n>=0} 2^n x^(2n+1) / (1 * 3 * ... * (2n+1))   for |x| < 2.5,
+        erf(x) = 1 - exp(-x^2) / sqrt(pi) / (x + (1/2) / (x + (2/2) / (x + (3/2) / (x + ...))))  for |x| >= 2.5,
+    whose terms are all positive, so there is no cancellation."""
+    x = np.asarray(x, dtype=np.float64)
+    absolute = np.abs(x)
+    out = np.ones(x.shape)
+
+    series = absolute < ERF_SERIES_LIMIT
+    y = absolute[series]
+    term = y.copy()
+    total = y.copy()
+    for n in range(1, ERF_SERIES_TERMS):
+        term *= 2 * y * y / (2 * n + 1)
+        total += term
+    out[series] = 2 / math.sqrt(math.pi) * np.exp(-y * y) * total
+
+    fraction = (absolute >= ERF_SERIES_LIMIT) & (absolute < ERF_ONE)
+    y = absolute[fraction]
+    denominator = y.copy()
+    for k in range(ERF_FRACTION_TERMS, 0, -1):
+        denominator = y + (k / 2) / denominator
+    out[fraction] = 1 - np.exp(-y * y) / math.sqrt(math.pi) / denominator
+    return np.copysign(out, x)
+
+
+def ln_cdf(x: Union[float, np.array], max_iter: int) -> Union[float, np.array]:
+    """Distribution function of the Ln statistic. See LnTest.get_cdf and get_ln_cdf_weights"""
+    points = np.atleast_1d(np.asarray(x, dtype=np.float64)).ravel()
+    out = np.zeros(points.size)
+    weights = get_ln_cdf_weights(max_iter)
+
+    if _backend == 'numba':
+        _get_compiled('ln_cdf')(points, weights, out)
+    else:
+        a = 2 * np.arange(max_iter + 1) + 1
+        positive = np.flatnonzero(points > 0)
+        for chunk in np.array_split(positive, max(1, positive.size * max_iter // CHUNK_SIZE)):
+            ax = np.multiply.outer(points[chunk], a)
+            phi = np.exp(-0.5 * ax * ax) / math.sqrt(2 * math.pi)
+            res = 0.5 * _erf(ax / math.sqrt(2.0)) @ weights - points[chunk] * phi.sum(axis=1)
+            out[chunk] = np.clip(4 * res, 0.0, 1.0)  # fix numerical errors
+    return out.reshape(np.shape(x))[()]
@@ -0,0 +1,163 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Distribution functions of the Kolmogorov Smirnov statistics sqrt(n) * D_n and sqrt(n) * D_n^+ for finite n.
+
+For D_n and n <= EXACT_N_MAX, the exact algorithm of Marsaglia, Tsang and Wang (2003): "Evaluating Kolmogorov's
+distribution", Journal of Statistical Software 8(18), is used. For larger n, the asymptotic distribution is
+evaluated at the argument corrected by Stephens (1970): x * (1 + 0.12 / sqrt(n) + 0.11 / n).
+
+For the one-sided D_n^+ = sup F_n(t) - t, the exact formula of Birnbaum and Tingey (1951): "One-sided confidence
+contours for probability distribution functions", Annals of Mathematical Statistics 22(4), is used for every n.
+"""
+
+from functools import lru_cache
+from math import sqrt, lgamma, log, exp
+from typing import Callable, Union
+import numpy as np
+
+# local file imports
+from statistical_tests.kernels import ks_cdf
+
+EXACT_N_MAX = 200  # beyond, the correction of Stephens is accurate to 1e-3 in the upper tail
+
+
+def marsaglia_tsang_wang(n: int, d: float) -> float:
+    """Returns P(D_n < d) exactly, where D_n = sup |F_n(t) - t|."""
+    if d <= 0.5 / n:
+        return 0.0
+    if d >= 1.0:
+        return 1.0
+
+    k = int(n * d) + 1
+    m = 2 * k - 1
+    h = k - n * d
+
+    i, j = np.indices((m, m))
+    matrix = (i - j + 1 >= 0).astype(np.float64)
+    powers = h ** np.arange(1, m + 1)
+    matrix[:, 0] -= powers
+    matrix[m - 1, :] -= powers[::-1]
+    if 2 * h - 1 > 0:
+        matrix[m - 1, 0] += (2 * h - 1) ** m
+    # divide each entry by (i - j + 1)!
+    inverse_factorials = np.exp([-lgamma(g + 1) for g in range(m + 1)])
+    matrix *= np.where(i - j + 1 > 0, inverse_factorials[np.clip(i - j + 1, 0, m)], 1.0)
+
+    power, exponent = _matrix_power(matrix, n)
+    value = power[k - 1, k - 1]
+    if value <= 0.0:
+        return 0.0
+    # multiply by n! / n^n in log space
+    return min(1.0, exp(log(value) + exponent * log(2.0) + lgamma(n + 1) - n * log(n)))
+
+
+def _matrix_power(matrix: np.array, n: int) -> (np.array, int):
+    """Returns (Q, e) with matrix^n = Q * 2^e. The matrix is rescaled after each product to avoid overflow."""
+    result = np.eye(matrix.shape[0])
+    result_exponent = 0
+    base = matrix
+    base_exponent = 0
+
+    while n > 0:
+        if n % 2 == 1:
+            result = result @ base
+            result_exponent += base_exponent
+            result, result_exponent = _normalize(result, result_exponent)
+        n //= 2
+        if n > 0:
+            base = base @ base
+            base_exponent *= 2
+            base, base_exponent = _normalize(base, base_exponent)
+    return result, result_exponent
+
+
+def _normalize(matrix: np.array, exponent: int) -> (np.array, int):
+    largest = np.abs(matrix).max()
+    if largest == 0.0:
+        return matrix, exponent
+    shift = np.frexp(largest)[1]
+    return np.ldexp(matrix, -shift), exponent + int(shift)
+
+
+@lru_cache(maxsize=None)
+def get_finite_n_cdf(n: int, max_iter: int = 100) -> Callable[[Union[float, np.array]], Union[float, np.array]]:
+    """Returns the distribution function of sqrt(n) * D_n. It is memoized for each n (and max_iter, which is only
+    used by the asymptotic distribution for n > EXACT_N_MAX). The function also accepts arrays."""
+    if n < 1:
+        raise ValueError("n must be positive")
+
+    if n > EXACT_N_MAX:
+        correction = 1 + 0.12 / sqrt(n) + 0.11 / n
+
+        def result(x: Union[float, np.array]) -> Union[float, np.array]:
+            return ks_cdf(np.asarray(x, dtype=np.float64) * correction, max_iter)
+        return result
+
+    @lru_cache(maxsize=4096)
+    def exact(x: float) -> float:
+        return marsaglia_tsang_wang(n, x / sqrt(n))
+
+    def result(x: Union[float, np.array]) -> Union[float, np.array]:
+        if np.ndim(x) == 0:
+            return exact(float(x))
+        return np.vectorize(lambda y: exact(float(y)), otypes=[np.float64])(x)
+    return result
+
+
+def birnbaum_tingey(n: int, d: Union[float, np.array]) -> Union[float, np.array]:
+    """Returns P(D_n^+ <= d) exactly. The terms of the sum are evaluated in log space, so there is no overflow of the
+    binomial coefficients. Also accepts arrays, then the complexity is O(len(d) * n)."""
+    d_array = np.atleast_1d(np.asarray(d, dtype=np.float64))
+    result = np.where(d_array <= 0.0, 0.0, 1.0)
+    inner = (d_array > 0.0) & (d_array < 1.0)
+
+    if np.any(inner):
+        x = d_array[inner][:, np.newaxis]
+        j = np.arange(n + 1)
+        log_factorials = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, n + 1)))))
+        log_binomials = log_factorials[n] - log_factorials[j] - log_factorials[n - j]
+
+        # P(D_n^+ >= d) = d * sum_{j=0}^{floor(n(1-d))} binomial(n, j) (1 - d - j/n)^(n-j) (d + j/n)^(j-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_terms = log_binomials + (n - j) * np.log(1 - x - j / n) + (j - 1) * np.log(x + j / n)
+        log_terms = np.where(j <= n * (1 - x), log_terms, -np.inf)
+        largest = log_terms.max(axis=1, keepdims=True)
+        log_sum = largest[:, 0] + np.log(np.exp(log_terms - largest).sum(axis=1))
+        result[inner] = np.clip(1.0 - x[:, 0] * np.exp(log_sum), 0.0, 1.0)
+
+    if np.ndim(d) == 0:
+        return float(result[0])
+    return result
+
+
+@lru_cache(maxsize=None)
+def get_finite_n_onesided_cdf(n: int) -> Callable[[Union[float, np.array]], Union[float, np.array]]:
+    """Returns the distribution function of sqrt(n) * D_n^+, which also accepts arrays. It is memoized for each n."""
+    if n < 1:
+        raise ValueError("n must be positive")
+
+    def result(x: Union[float, np.array]) -> Union[float, np.array]:
+        return birnbaum_tingey(n, np.asarray(x, dtype=np.float64) / sqrt(n))
+    return result
+
+
+def get_finite_n_quantile(n: int,
+                          quantile: float,
+                          epsilon: float = 0.0001,
+                          max_iter: int = 100,
+                          one_sided: bool = False
+                          ) -> float:
+    """Returns x with |P(sqrt(n) * D_n <= x) - quantile| < epsilon by bisection, or of D_n^+ iff one_sided."""
+    if quantile <= 0 or quantile >= 1:
+        raise ValueError("parameter alpha must be between 0 and 1")
+    cdf = get_finite_n_onesided_cdf(n) if one_sided else get_finite_n_cdf(n, max_iter)
+    lower, upper = 0.0, sqrt(n)  # sqrt(n) * D_n <= sqrt(n)
+
+    while True:
+        middle = (lower + upper) / 2
+        value = cdf(middle)
+        if abs(value - quantile) < epsilon or upper - lower < 1e-12:
+            return middle
+        if value < quantile:
+            lower = middle
+        else:
+            upper = middle
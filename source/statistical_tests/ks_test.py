@@ -1,13 +1,26 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 
-from math import sqrt, pi, exp
-from typing import Callable
+from typing import Callable, List, Union
+import numpy as np
 
 # local file imports
 from statistical_tests.statistical_test import StatisticalTest
+from statistical_tests.kernels import ks_cdf
+from statistical_tests.ks_finite_n import get_finite_n_cdf, get_finite_n_quantile
 
 
 class KsTest(StatisticalTest):
+    """do_test and the simulations use the asymptotic critical values by default, as they have always been. With
+    finite_n=True, they use the exact critical values for data of length n instead, see ks_finite_n.py
+    get_critical_value(n=...) always returns the exact one."""
+    def __init__(self,
+                 data_vector: Union[np.array, List[float]] = None,
+                 color: str = 'r',
+                 sort_in_place: bool = False,
+                 finite_n: bool = False):
+        self.finite_n = finite_n
+        super().__init__(data_vector, color=color, sort_in_place=sort_in_place)
+
     def get_name(self) -> str:
         return "Kolmogorov Smirnov test"
 
@@ -15,19 +28,30 @@ class KsTest(StatisticalTest):
         """ See equation (2.7) in master_thesis.pdf"""
         return self._get_uep_abs_max()[1]
 
-    def get_cdf(self, max_iter: int) -> Callable[[float], float]:
+    def get_cdf(self, max_iter: int, n: int = -1) -> Callable[[float], float]:
         """
-        Return the Kolmogorov Smirnov distribution function
+        Return the Kolmogorov Smirnov distribution function. For n != -1, the distribution function of the statistic
+        for data of length n is returned, see ks_finite_n.py
         See theorem 2.2.6 in master_thesis.pdf and
         https://en.wikipedia.org/wiki/Kolmogorov%E2%80%93Smirnov_test#Kolmogorov_distribution for the other formula.
         The formula in master_thesis.pdf has an extremly high numerical error when calculation a finite sum.
+        The series is evaluated by kernels.ks_cdf, which also accepts arrays.
         """
+        if n != -1:
+            return get_finite_n_cdf(n, max_iter)
+
         def result(x: float) -> float:
-            if x <= 0:
-                return 0.0
-            res = 0.0
-            for k in range(1, max_iter + 1, 1):
-                a = 2 * k - 1
-                res += exp(-(a * a * pi * pi) / (8 * x * x))
-            return (sqrt(2 * pi) / x) * res
+            return ks_cdf(x, max_iter)
         return result
+
+    def get_critical_value_n(self, n: int) -> int:
+        return n if self.finite_n and n > 0 else -1
+
+    def get_critical_value_method(self) -> str:
+        return "asymptotic quantile table v1, exact finite n v1"
+
+    def get_critical_value(self, alpha: float, epsilon: float = 0.0001, max_iter: int = 100, n: int = -1) -> float:
+        """Returns the asymptotic critical value for n = -1 and the exact one for data of length n otherwise."""
+        if n == -1:
+            return super().get_critical_value(alpha, epsilon=epsilon, max_iter=max_iter)
+        return get_finite_n_quantile(n, 1 - alpha, epsilon=epsilon, max_iter=max_iter)
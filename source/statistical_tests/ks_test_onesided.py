@@ -1,13 +1,26 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 
 from math import sqrt, exp, log
-from typing import Callable
+from typing import Callable, List, Union
+import numpy as np
 
 # local file imports
 from statistical_tests.statistical_test import StatisticalTest
+from statistical_tests.ks_finite_n import get_finite_n_onesided_cdf, get_finite_n_quantile
 
 
 class KsTestOneSided(StatisticalTest):
+    """do_test and the simulations use the asymptotic critical values by default. With finite_n=True, they use the
+    exact critical values for data of length n instead, see ks_finite_n.py
+    get_critical_value(n=...) always returns the exact one."""
+    def __init__(self,
+                 data_vector: Union[np.array, List[float]] = None,
+                 color: str = 'r',
+                 sort_in_place: bool = False,
+                 finite_n: bool = False):
+        self.finite_n = finite_n
+        super().__init__(data_vector, color=color, sort_in_place=sort_in_place)
+
     def get_name(self) -> str:
         return "one-sided Kolmogorov Smirnov test"
 
@@ -15,17 +28,30 @@ class KsTestOneSided(StatisticalTest):
         """ See theorem 2.3.4 in master_thesis.pdf """
         return self._get_uep_max()[1]
 
-    def get_cdf(self, max_iter: int) -> Callable[[float], float]:
-        """ See theorem 2.3.3 in master_thesis.pdf """
+    def get_cdf(self, max_iter: int, n: int = -1) -> Callable[[float], float]:
+        """ See theorem 2.3.3 in master_thesis.pdf
+        For n != -1, the exact distribution function for data of length n is returned, see ks_finite_n.py """
+        if n != -1:
+            return get_finite_n_onesided_cdf(n)
+
         def result(x: float) -> float:
             if x <= 0:
                 return 0.0
             return 1 - exp(-2 * x * x)
         return result
 
+    def get_critical_value_n(self, n: int) -> int:
+        return n if self.finite_n and n > 0 else -1
+
+    def get_critical_value_method(self) -> str:
+        return "asymptotic v1, exact finite n v1"
+
     def get_critical_value(self, alpha: float, epsilon: float = 0.0001, max_iter: int = 100, n: int = -1) -> float:
         """
-        See equation (2.18) in master_thesis.pdf
-        Parameters epsilon, max_iter and n will be ignored.
+        See equation (2.18) in master_thesis.pdf for n = -1.
+        Otherwise, the exact critical value for data of length n is returned with precision epsilon.
+        Parameter max_iter will be ignored.
         """
-        return sqrt(-0.5 * log(alpha))
+        if n == -1:
+            return sqrt(-0.5 * log(alpha))
+        return get_finite_n_quantile(n, 1 - alpha, epsilon=epsilon, one_sided=True)
@@ -2,6 +2,7 @@
 
 from math import sqrt, exp, pi
 from typing import Callable
+import numpy as np
 
 # local file imports
 from statistical_tests.statistical_test import StatisticalTest
@@ -15,7 +16,7 @@ class LnTestOneSided(StatisticalTest):
     def get_statistic(self) -> float:
         """ See equation (2.21) in master_thesis.pdf """
         argmax, max_value = self._get_uep_max()
-        return max_value / sqrt(argmax * (1 - argmax))
+        return max_value / np.sqrt(argmax * (1 - argmax))
 
     def get_cdf(self, max_iter: int) -> Callable[[float], float]:
         """ See theorem 2.3.7 in master_thesis.pdf """
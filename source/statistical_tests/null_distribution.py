@@ -0,0 +1,99 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Simulated distributions of the test statistics under H0 for finite n, used for p-values."""
+
+import os
+from typing import Dict, List, Union
+import numpy as np
+
+# local file imports
+from statistical_tests.sorted_sample import SortedSample
+from simulation.statistic_tools import get_sorted_uniform_values
+
+NULL_DISTRIBUTION_DIRECTORY = 'null_distributions'
+
+
+class NullDistribution:
+    """The sorted statistics of number_of_samples uniformly distributed vectors of length n."""
+    def __init__(self, test_name: str, n: int, statistics: np.array):
+        self.test_name = test_name
+        self.n = n
+        self.statistics = np.sort(statistics)
+
+    @property
+    def number_of_samples(self) -> int:
+        return self.statistics.size
+
+    @staticmethod
+    def get_filename(test_name: str, n: int) -> str:
+        return os.path.join(NULL_DISTRIBUTION_DIRECTORY, test_name.strip() + " n=" + str(n) + ".npy")
+
+    def p_value(self, statistic: Union[float, np.array]) -> Union[float, np.array]:
+        """Returns (1 + #{simulated statistics >= statistic}) / (1 + number_of_samples) with a binary search."""
+        greater_equal = self.number_of_samples - np.searchsorted(self.statistics, statistic, side='left')
+        return (1 + greater_equal) / (1 + self.number_of_samples)
+
+    def get_quantile(self, quantile: Union[float, np.array]) -> Union[float, np.array]:
+        return np.quantile(self.statistics, quantile)
+
+    def save(self) -> None:
+        """Writes to a temporary file first, so other processes never read a partially written file."""
+        filename = self.get_filename(self.test_name, self.n)
+        os.makedirs(NULL_DISTRIBUTION_DIRECTORY, exist_ok=True)
+        temporary_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filename, 'wb') as file:
+            np.save(file, self.statistics)
+        os.replace(temporary_filename, filename)
+
+    @staticmethod
+    def load(test_name: str, n: int) -> Union['NullDistribution', None]:
+        """Return None if there is no such file."""
+        filename = NullDistribution.get_filename(test_name, n)
+        if not os.path.isfile(filename):
+            return None
+        return NullDistribution(test_name, n, np.load(filename))
+
+
+def simulate_null_statistics(test_classes: List[type],
+                             n: int,
+                             number_of_samples: int,
+                             block_size: int = 1000
+                             ) -> Dict[str, np.array]:
+    """Returns the statistics of number_of_samples uniformly distributed vectors of length n for each test.
+    The vectors are generated, sorted and evaluated block by block. All tests share the same sorted blocks."""
+    tests = [test_class() for test_class in test_classes]
+    result = {test.get_name(): np.empty(number_of_samples) for test in tests}
+
+    for start in range(0, number_of_samples, block_size):
+        stop = min(start + block_size, number_of_samples)
+        sample = SortedSample(get_sorted_uniform_values(n, rows=stop - start), presorted=True)
+        for test in tests:
+            test.sample = sample
+            result[test.get_name()][start:stop] = test.get_statistic()
+    return result
+
+
+_null_distributions = {}  # in-process cache: (test name, n) -> NullDistribution
+
+
+def get_null_distribution(test, n: int, number_of_samples: int = 10 ** 4) -> NullDistribution:
+    """Returns the null distribution of the given statistical test for vectors of length n.
+    It is loaded from disk or simulated and saved iff there is no distribution with at least number_of_samples."""
+    name = test.get_name()
+    key = (name, n)
+    distribution = _null_distributions.get(key)
+
+    if distribution is None or distribution.number_of_samples < number_of_samples:
+        distribution = NullDistribution.load(name, n)
+        if distribution is None or distribution.number_of_samples < number_of_samples:
+            generate_null_distributions([type(test)], n, number_of_samples)
+            distribution = _null_distributions[key]
+        _null_distributions[key] = distribution
+    return distribution
+
+
+def generate_null_distributions(test_classes: List[type], n: int, number_of_samples: int) -> None:
+    """Simulates and saves the null distributions of all given tests at once."""
+    for name, statistics in simulate_null_statistics(test_classes, n, number_of_samples).items():
+        distribution = NullDistribution(name, n, statistics)
+        distribution.save()
+        _null_distributions[(name, n)] = distribution
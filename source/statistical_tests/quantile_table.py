@@ -1,9 +1,10 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 import os
-from typing import Union
+from typing import Union, List
 
 # local file imports
 from statistical_tests.quantile_table_entry import QuantileTableEntry
+from simulation.instrumentation import instrumentation
 
 
 class QuantileTable:
@@ -15,14 +16,23 @@ class QuantileTable:
         self.load()
 
     def save(self) -> None:
+        """Writes to a temporary file first and replaces the table afterwards,
+        so an interrupted or concurrent save never leaves a partially written table.
+        Quantiles which another process has saved in the meantime are merged in, if they are better."""
         if "Vn" in self.filename:
             return
+        temporary_filename = self.filename + '.' + str(os.getpid()) + '.tmp'
         try:
-            with open(self.filename, 'w') as file:
+            if os.path.isfile(self.filename):
+                for q in self.__read():
+                    self.append(q)
+
+            with open(temporary_filename, 'w') as file:
                 s = self.separator
                 file.write('alpha' + s + "value" + s + "epsilon" + s + "max_iter\n")  # write headline
                 for q in self.quantiles:
                     file.write(q.to_string(separator=self.separator) + '\n')
+            os.replace(temporary_filename, self.filename)
         except Exception as e:
             print(e)
 
@@ -30,15 +40,20 @@ class QuantileTable:
         if "Vn" in self.filename:
             return
         try:
-            with open(self.filename, 'r') as file:
-                content = file.readlines()
-                content = [x.strip().replace(',', '.') for x in content]  # remove Linebreaks \n
-                for line in content[1:]:
-                    s = line.split(self.separator)
-                    self.quantiles.append(QuantileTableEntry(round(float(s[0]), 10), float(s[1]), float(s[2]), int(s[3])))
+            self.quantiles.extend(self.__read())
         except Exception as e:
             print(e)
 
+    def __read(self) -> List[QuantileTableEntry]:
+        with open(self.filename, 'r') as file:
+            content = file.readlines()
+            content = [x.strip().replace(',', '.') for x in content]  # remove Linebreaks \n
+            result = []
+            for line in content[1:]:
+                s = line.split(self.separator)
+                result.append(QuantileTableEntry(round(float(s[0]), 10), float(s[1]), float(s[2]), int(s[3])))
+            return result
+
     def append(self, quantile: QuantileTableEntry) -> None:
         q = self.__get(quantile.alpha)
 
@@ -50,10 +65,10 @@ class QuantileTable:
 
     def get(self, alpha: float, epsilon: float, max_iter: int) -> Union[QuantileTableEntry, None]:
         q = self.__get(alpha)
-        if q is None:
-            return q
-        if q.epsilon <= epsilon and q.max_iter >= max_iter:
+        if q is not None and q.epsilon <= epsilon and q.max_iter >= max_iter:
+            instrumentation.count('quantile table hits')
             return q
+        instrumentation.count('quantile table misses')
         return None
 
     def __get(self, alpha: float) -> Union[QuantileTableEntry, None]:
@@ -0,0 +1,89 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Generates quantile tables of several tests in parallel."""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+import numpy as np
+
+# local file imports
+from statistical_tests.quantile_table_entry import QuantileTableEntry
+from statistical_tests import cdf_surrogate
+
+
+def get_alphas(resolution: int) -> List[float]:
+    """Returns the alphas of a quantile table: all multiples of 1 / resolution between 0 and 1 (both excluded)."""
+    alphas = np.linspace(0., 1., resolution, endpoint=False)
+    return [round(alpha, 10) for alpha in alphas[1:]]  # remove numerical error
+
+
+def _initialize_worker() -> None:
+    """The workers use the surrogates of the distribution functions, which the main process has built."""
+    cdf_surrogate.BUILD_SURROGATES = False
+
+
+def _calculate_quantile(test_class: type, alpha: float, epsilon: float, max_iter: int) -> Tuple[str, float, float]:
+    """Runs in a worker process. Only the main process saves the tables."""
+    test = test_class()
+    return test.get_name(), alpha, test.get_quantile(quantile=alpha, epsilon=epsilon, max_iter=max_iter, save=False)
+
+
+def generate_quantile_tables(test_classes: List[type],
+                             resolution: int,
+                             epsilon: float,
+                             max_iter: int,
+                             processes: int = None,
+                             resume: bool = True,
+                             save_interval: int = 10,
+                             printing: bool = True
+                             ) -> None:
+    """Calculates the quantiles of all given tests for all alphas of the grid in a process pool.
+
+    Parameters:
+        test_classes (list): The statistical tests, e.g. [KsTest, LnTest]. Each test needs a distribution function.
+        resolution (int): See get_alphas.
+        epsilon (float): The precision of each quantile.
+        max_iter (int): The number of iterations of the distribution function.
+        processes (int): The number of worker processes. Uses all cores iff None.
+        resume (bool): Skips all quantiles which are already in the table with at least the given precision.
+            So an interrupted generation can be continued.
+        save_interval (int): The tables are saved after that many new quantiles, and when all are finished.
+        printing (bool): Prints the progress iff True.
+
+    The results are merged into the tables of the main process by QuantileTable.append, so a quantile replaces an
+    existing one only if it is better. On Windows, this function must be called inside an
+    if __name__ == "__main__" block.
+    """
+    tests = {}
+    tasks = []
+    for test_class in test_classes:
+        test = test_class()
+        tests[test.get_name()] = test
+        for alpha in get_alphas(resolution):
+            if not resume or test._quantile_table.get(alpha=alpha, epsilon=epsilon, max_iter=max_iter) is None:
+                tasks.append((test_class, alpha))
+
+    if printing:
+        print(str(len(tasks)) + " quantiles need to be calculated.")
+    for name in {test_class().get_name() for test_class, alpha in tasks}:
+        tests[name]._get_cdf_for_quantiles(epsilon, max_iter)  # builds and saves the surrogate only once
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker) as executor:
+        futures = [executor.submit(_calculate_quantile, test_class, alpha, epsilon, max_iter)
+                   for test_class, alpha in tasks]
+
+        for i, future in enumerate(as_completed(futures), start=1):
+            name, alpha, value = future.result()
+            tests[name]._quantile_table.append(QuantileTableEntry(alpha, value, epsilon, max_iter))
+
+            if printing:
+                elapsed = time.time() - start_time
+                print(str(i) + "/" + str(len(tasks)) + " " + name + " alpha: " + str(alpha) + " Quantil: "
+                      + str(value) + "; ETA: " + str(round(elapsed / i * (len(tasks) - i))) + " seconds")
+            if i % save_interval == 0:
+                for test in tests.values():
+                    test.save_quantile_table()
+
+    for test in tests.values():
+        test.save_quantile_table()
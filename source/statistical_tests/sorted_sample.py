@@ -0,0 +1,105 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+
+from typing import Union, List, Tuple
+import numpy as np
+
+# local file imports
+from statistical_tests import kernels
+
+
+class SortedSample:
+    """Evaluation context which is shared by all statistical tests on the same data.
+    The data is sorted only once and the extrema of the uniform empirical process U_n are computed only once,
+    no matter how many tests use them.
+
+    The data is either a vector or a matrix with one sample per row. In the latter case all extrema are vectors
+    with one entry per row.
+
+    Between two order statistics, U_n is linear and |U_n(t)| / sqrt(t(1-t)) is monotone, so all suprema are
+    attained at the order statistics x_i: either at x_i itself (U_n(x_i) = sqrt(n) * (F_n(x_i) - x_i)) or as
+    the left-hand limit (sqrt(n) * (F_n(x_i-) - x_i)). Both values are computed exactly, also for ties.
+    """
+    def __init__(self, data: Union[np.array, List[float]], sort_in_place: bool = False, presorted: bool = False):
+        """If presorted, the data must be sorted already and is used as data_sorted without copying or sorting,
+        e.g. the values of simulation.statistic_tools.get_sorted_random_values."""
+        data = np.asarray(data)
+        if presorted:
+            self.data_sorted = data
+        elif sort_in_place:
+            data.sort(axis=-1)
+            self.data_sorted = data
+        else:
+            self.data_sorted = np.sort(data, axis=-1)
+        self.n = self.data_sorted.shape[-1] if self.data_sorted.ndim > 0 else 0
+        self._extrema = {}
+
+    def _get_uep_at_order_statistics(self) -> Tuple[np.array, np.array]:
+        """Returns F_n(x_i) - x_i and F_n(x_i-) - x_i for all order statistics x_i."""
+        if 'uep' not in self._extrema:
+            x = self.data_sorted
+            index = np.arange(1, self.n + 1)
+
+            first_of_ties = np.ones(x.shape, dtype=bool)
+            first_of_ties[..., 1:] = x[..., 1:] != x[..., :-1]
+            count_less = np.maximum.accumulate(np.where(first_of_ties, index - 1, 0), axis=-1)
+
+            last_of_ties = np.ones(x.shape, dtype=bool)
+            last_of_ties[..., :-1] = first_of_ties[..., 1:]
+            count_less_equal = np.minimum.accumulate(np.where(last_of_ties, index, self.n)[..., ::-1], axis=-1)[..., ::-1]
+
+            dtype = x.dtype if x.dtype == np.float32 else np.float64  # float32 data keeps float32 intermediates
+            self._extrema['uep'] = (np.divide(count_less_equal, self.n, dtype=dtype) - x,
+                                    np.divide(count_less, self.n, dtype=dtype) - x)
+        return self._extrema['uep']
+
+    def _get_weights(self) -> np.array:
+        """Returns 1 / sqrt(t(1-t)) at the order statistics and 0 outside of (0, 1)."""
+        if 'weights' not in self._extrema:
+            x = self.data_sorted
+            inside = (x > 0.0) & (x < 1.0)
+            weights = np.zeros(x.shape, dtype=x.dtype if x.dtype == np.float32 else np.float64)
+            weights[inside] = 1 / np.sqrt(x[inside] * (1 - x[inside]))
+            self._extrema['weights'] = weights
+        return self._extrema['weights']
+
+    def _get_argmax_max(self, key: str) -> Tuple[Union[float, np.array], Union[float, np.array]]:
+        """Returns argmax and maximum of the functional of U_n with the given key, see kernels.UEP_EXTREMA_KEYS.
+        The numba backend computes all four extrema in one pass."""
+        if key not in self._extrema:
+            if self.n == 0:
+                raise ValueError("there is no data")
+            if kernels.get_backend() == 'numba':
+                self._extrema.update(kernels.uep_extrema(self.data_sorted))
+                return self._extrema[key]
+
+            upper, lower = self._get_uep_at_order_statistics()
+            if key == 'uep_max':
+                values = upper
+            elif key == 'uep_abs_max':
+                values = np.maximum(upper, -lower)
+            elif key == 'weighted_uep_max':
+                values = upper * self._get_weights()
+            else:
+                values = np.maximum(upper, -lower) * self._get_weights()
+
+            index = np.argmax(values, axis=-1)[..., np.newaxis]
+            argmax = np.take_along_axis(self.data_sorted, index, axis=-1)[..., 0]
+            max_value = np.sqrt(self.n) * np.take_along_axis(values, index, axis=-1)[..., 0]
+            self._extrema[key] = (argmax, max_value)
+        return self._extrema[key]
+
+    def get_uep_max(self) -> Tuple[Union[float, np.array], Union[float, np.array]]:
+        """Returns argmax and maximum of U_n."""
+        return self._get_argmax_max('uep_max')
+
+    def get_uep_abs_max(self) -> Tuple[Union[float, np.array], Union[float, np.array]]:
+        """Returns argmax and maximum of |U_n|."""
+        return self._get_argmax_max('uep_abs_max')
+
+    def get_weighted_uep_max(self) -> Tuple[Union[float, np.array], Union[float, np.array]]:
+        """Returns argmax and maximum of U_n(t) / sqrt(t(1-t))."""
+        return self._get_argmax_max('weighted_uep_max')
+
+    def get_weighted_uep_abs_max(self) -> Tuple[Union[float, np.array], Union[float, np.array]]:
+        """Returns argmax and maximum of |U_n(t)| / sqrt(t(1-t))."""
+        return self._get_argmax_max('weighted_uep_abs_max')
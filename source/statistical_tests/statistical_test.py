@@ -1,24 +1,34 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
+from __future__ import annotations
 import sys
-from math import sqrt
 from typing import Callable, Union, List
 import numpy as np
 from abc import ABC, abstractmethod
 
 # local file imports
-from plotting.plotting import plot, FunctionToPlot
 from statistical_tests.quantile_table import QuantileTable
 from statistical_tests.quantile_table_entry import QuantileTableEntry
+from statistical_tests.data_loader import load_data
+from statistical_tests.sorted_sample import SortedSample
+from statistical_tests.empirical_process import EmpiricalDistributionFunction, UniformEmpiricalProcess
+from statistical_tests.null_distribution import get_null_distribution
+from statistical_tests.quantile_table_generation import generate_quantile_tables, get_alphas
+from statistical_tests.critical_value_cache import critical_value_cache, CriticalValueCache
+from statistical_tests.cdf_surrogate import ChebyshevSurrogate, get_cdf_surrogate, DEFAULT_TOLERANCE
+from simulation.instrumentation import instrumentation
 
 
 class StatisticalTest(ABC):
     _data = np.array([])  # a vector of random values
 
-    def __init__(self, data_vector: Union[np.array, List[float]] = None, color: str = 'r'):
+    def __init__(self,
+                 data_vector: Union[np.array, List[float]] = None,
+                 color: str = 'r',
+                 sort_in_place: bool = False):
         if data_vector is None:
             data_vector = np.array([])
 
-        self.data = np.asarray(data_vector)
+        self.set_data(data_vector, sort_in_place=sort_in_place)
         self.color = color
         self._quantile_table = QuantileTable(self.get_name())
         super().__init__()
@@ -29,9 +39,41 @@ class StatisticalTest(ABC):
 
     @data.setter
     def data(self, data_vector: np.array) -> None:
+        self.set_data(data_vector)
+
+    def set_data(self,
+                 data_vector: Union[np.array, List[float]],
+                 sort_in_place: bool = False,
+                 presorted: bool = False) -> None:
+        """Sets the data without copying numpy arrays (e.g. memory-mapped files).
+        If sort_in_place is True, the given array itself is sorted and used as data_sorted, so there is no second
+        copy of the data. Afterwards, self.data is sorted too. This requires a writable array.
+        If presorted is True, the data must be sorted already and is not sorted again."""
         self._data = np.asarray(data_vector)
-        self.data_sorted = np.sort(self.data)
-        self.n = self.data.size
+        self._sample = SortedSample(self._data, sort_in_place=sort_in_place, presorted=presorted)
+        self.n = self._sample.n
+
+    @property
+    def sample(self) -> SortedSample:
+        return self._sample
+
+    @sample.setter
+    def sample(self, sample: SortedSample) -> None:
+        """Shares an already sorted sample (and its extrema) between several tests. self.data becomes the sorted data."""
+        self._data = sample.data_sorted
+        self._sample = sample
+        self.n = sample.n
+
+    @property
+    def data_sorted(self) -> np.array:
+        return self._sample.data_sorted
+
+    @classmethod
+    def from_file(cls, filename: str, color: str = 'r', sort_in_place: bool = False, **kwargs) -> StatisticalTest:
+        """Creates a test for the data in the given file. See data_loader.load_data for the supported formats.
+        Binary files are memory-mapped copy-on-write, so sorting in place never modifies the file."""
+        data = load_data(filename, writable=sort_in_place, **kwargs)
+        return cls(data_vector=data, color=color, sort_in_place=sort_in_place)
 
     @abstractmethod
     def get_statistic(self) -> float:
@@ -45,10 +87,15 @@ class StatisticalTest(ABC):
     def get_name(self) -> str:
         pass
 
+    def get_fast_cdf(self, max_iter: int, tolerance: float = DEFAULT_TOLERANCE) -> ChebyshevSurrogate:
+        """Returns an approximation of get_cdf(max_iter) with an error below tolerance, which also accepts arrays and
+        has a density. It is built only once and saved in the directory quantile_tables. See cdf_surrogate.py"""
+        return get_cdf_surrogate(self, max_iter, tolerance)
+
     def do_test(self, alpha: float, printing: bool = True) -> bool:
         """Return true iff H0 is dismissed. So true means, that the data is not uniformly distributed."""
         t_n = self.get_statistic()
-        c_alpha = self.get_critical_value(alpha)
+        c_alpha = self.get_cached_critical_value(alpha)
 
         if printing:
             if t_n > c_alpha:
@@ -59,25 +106,48 @@ class StatisticalTest(ABC):
                     c_alpha) + " = c_alpha. Therefore, the data is uniformly distributed")
         return t_n > c_alpha
 
-    def get_quantile(self, quantile: float, epsilon: float, max_iter: int) -> float:
+    def p_value(self, number_of_samples: int = 10 ** 4) -> float:
+        """Returns the p-value of the statistic, i.e. the probability of a statistic at least as large under H0.
+        It is looked up in a simulated null distribution for vectors of length self.n, which is generated only once
+        and saved in the directory null_distributions. See null_distribution.py"""
+        if self.n == 0:
+            raise ValueError("there is no data")
+        return get_null_distribution(self, self.n, number_of_samples).p_value(self.get_statistic())
+
+    def get_quantile(self, quantile: float, epsilon: float, max_iter: int, save: bool = True) -> float:
+        """Returns the quantile from the quantile table or calculates it.
+        A new quantile is saved in the table file immediately iff save is True. When calculating many quantiles,
+        pass save=False and call save_quantile_table once at the end, because each save rewrites the whole file."""
         if quantile <= 0 or quantile >= 1:
             raise ValueError("parameter alpha must be between 0 and 1")
         if epsilon < 0:
             raise ValueError("parameter epsilon must be between 0 and 1")
 
+        quantile = round(quantile, 10)  # e.g. 1 - 0.07 should find the quantile 0.93 in the table
         q = self._quantile_table.get(alpha=quantile, epsilon=epsilon, max_iter=max_iter)
         if q is None:
             new = self.__calculate_quantile(quantile, epsilon, max_iter)
             self._quantile_table.append(QuantileTableEntry(alpha=quantile, value=new, epsilon=epsilon, max_iter=max_iter))
+            if save:
+                self._quantile_table.save()
             return new
         else:
             return q.value
 
+    def _get_cdf_for_quantiles(self, epsilon: float, max_iter: int) -> Callable[[float], float]:
+        """Returns get_fast_cdf with an error below epsilon / 10, or get_cdf iff there is no such approximation,
+        e.g. because the series with few iterations does not reach 1."""
+        try:
+            return self.get_fast_cdf(max_iter, tolerance=min(DEFAULT_TOLERANCE, epsilon / 10))
+        except ValueError:
+            return self.get_cdf(max_iter)
+
     def __calculate_quantile(self, alpha: float, epsilon: float, max_iter: int) -> float:
         quantile = 0.5
-        df = self.get_cdf(max_iter)
+        df = self._get_cdf_for_quantiles(epsilon, max_iter)
 
         while True:
+            instrumentation.count('cdf evaluations')
             alpha_approx = df(quantile)
             if abs(alpha_approx - alpha) < epsilon:
                 return quantile
@@ -86,12 +156,38 @@ class StatisticalTest(ABC):
     def get_critical_value(self, alpha: float, epsilon: float = 0.0001, max_iter: int = 100, n: int = -1) -> float:
         return self.get_quantile(1 - alpha, epsilon=epsilon, max_iter=max_iter)
 
+    def get_cached_critical_value(self,
+                                  alpha: float,
+                                  epsilon: float = 0.0001,
+                                  max_iter: int = 100,
+                                  n: int = -1
+                                  ) -> float:
+        """Returns get_critical_value, memoized for all instances of the test and saved on disk for all processes.
+        See critical_value_cache.py"""
+        if n == -1:
+            n = self.get_critical_value_n(self.n)
+        key = CriticalValueCache.get_key(self.get_name(), self.get_critical_value_method(), alpha, n, epsilon,
+                                         max_iter)
+        return critical_value_cache.get_or_compute(
+            key, lambda: self.get_critical_value(alpha=alpha, epsilon=epsilon, max_iter=max_iter, n=n))
+
+    def get_critical_value_n(self, n: int) -> int:
+        """Returns the n, which is passed to get_critical_value for data of length n by default, e.g. by do_test and the
+        simulations. Here, -1 stands for the asymptotic critical value."""
+        return -1
+
+    def get_critical_value_method(self) -> str:
+        """Identifies how get_critical_value calculates its values. It is part of the keys of the critical value cache,
+        so it must be changed together with get_critical_value."""
+        return "asymptotic quantile table v1"
+
     def plot_cdf(self,
                  max_iter: int = 100,
                  x_min: float = 0.0,
                  x_max: float = 3.0,
                  resolution: int = 1000) -> None:
         """Plots the cumulative distribution function of the corresponding statistics."""
+        from plotting.plotting import plot, FunctionToPlot  # imported lazily, because matplotlib is slow to import
         f = FunctionToPlot(self.get_cdf(max_iter), label="F(x)", color=self.color)
         plot([f], x_min=x_min, x_max=x_max, resolution=resolution,
              title="cumulative distribution function of the " + self.get_name()
@@ -104,6 +200,7 @@ class StatisticalTest(ABC):
                  max_value: float = 0.0
                  ) -> None:
         """Plots the uniform empirical process of the given data."""
+        from plotting.plotting import plot, FunctionToPlot
         funcs = [FunctionToPlot(self.uep(), label="F(x)", color=self.color)]
         if max_value > 0.0:
             funcs.append(FunctionToPlot(lambda x: max_value, label='max'))
@@ -116,42 +213,35 @@ class StatisticalTest(ABC):
                      max_value: float = 0.0
                      ) -> None:
         """Plots the reflected uniform empirical process of the given data."""
+        from plotting.plotting import plot, FunctionToPlot
         funcs = [FunctionToPlot(self.uep_abs(), label="|U_n|", color=self.color)]
         if max_value > 0.0:
             funcs.append(FunctionToPlot(lambda x: max_value, label='max'))
         plot(funcs, x_min=x_min, x_max=x_max, resolution=resolution, title="uniform empirical process")
 
-    def ecdf(self) -> Callable[[float], float]:
-        """Return empirical cumulative distribution function."""
-        if self._data.size == 0:
-            raise ValueError("there is no data")
-
-        def result(v: float) -> float:
-            return np.searchsorted(self.data_sorted, v, side='right') / self.n
+    def ecdf(self) -> EmpiricalDistributionFunction:
+        """Return empirical cumulative distribution function. It also accepts arrays, see empirical_process.py"""
+        return EmpiricalDistributionFunction(self.data_sorted, is_sorted=True)
 
-        return result
-
-    def uep(self) -> Callable[[float], float]:
+    def uep(self) -> UniformEmpiricalProcess:
         """Return the uniform empirical process."""
+        return UniformEmpiricalProcess(self.data_sorted, is_sorted=True)
 
-        def result(x: float) -> float:
-            return sqrt(self.n) * (self.ecdf()(x) - x)
-
-        return result
-
-    def uep_abs(self) -> Callable[[float], float]:
+    def uep_abs(self) -> UniformEmpiricalProcess:
         """Return absolute value of the uniform empirical process."""
-
-        def result(x: float) -> float:
-            return abs(self.uep()(x))
-
-        return result
+        return UniformEmpiricalProcess(self.data_sorted, is_sorted=True, absolute=True)
 
     def _get_uep_max(self) -> (float, float):
-        return self._get_max_of_almost_piecewise_linear_function(self.uep())
+        return self._sample.get_uep_max()
 
     def _get_uep_abs_max(self) -> (float, float):
-        return self._get_max_of_almost_piecewise_linear_function(self.uep_abs())
+        return self._sample.get_uep_abs_max()
+
+    def _get_weighted_uep_max(self) -> (float, float):
+        return self._sample.get_weighted_uep_max()
+
+    def _get_weighted_uep_abs_max(self) -> (float, float):
+        return self._sample.get_weighted_uep_abs_max()
 
     def _get_max_of_almost_piecewise_linear_function(self, function: Callable[[float], float]) -> (float, float):
         """Returns argmax and maximum value of a functional of the uniform empirical process"""
@@ -174,12 +264,17 @@ class StatisticalTest(ABC):
                 argmax = data_i - epsilon
         return argmax, max_value
 
-    def generate_quantile_table(self, resolution: int, epsilon: float, max_iter: int) -> None:
-        alphas = np.linspace(0., 1., resolution, endpoint=False)
-        for alpha in alphas[1:]:
-            rounded_alpha = round(alpha, 10)  # remove numerical error
-            q = self.get_quantile(quantile=rounded_alpha, epsilon=epsilon, max_iter=max_iter)
-            print("alpha:", rounded_alpha, "Quantil:", q)
+    def generate_quantile_table(self, resolution: int, epsilon: float, max_iter: int, processes: int = 1) -> None:
+        """Calculates and saves the quantiles for all alphas in get_alphas(resolution).
+        If processes != 1, they are calculated in a process pool. See generate_quantile_tables."""
+        if processes != 1:
+            generate_quantile_tables([type(self)], resolution, epsilon, max_iter, processes=processes)
+            self._quantile_table = QuantileTable(self.get_name())  # reload the merged table
+            return
+
+        for alpha in get_alphas(resolution):
+            q = self.get_quantile(quantile=alpha, epsilon=epsilon, max_iter=max_iter, save=False)
+            print("alpha:", alpha, "Quantil:", q)
         self.save_quantile_table()
 
     def save_quantile_table(self) -> None:
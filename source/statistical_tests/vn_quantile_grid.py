@@ -0,0 +1,106 @@
+# Copyright 2020 by Willi Sontopski. All rights reserved.
+"""Simulated critical values of the Vn tests on a grid of (n, alpha).
+
+The Darling Erdös limit of the Vn statistics converges with log log n, so the asymptotic critical values are poor
+for all practical n. Therefore, the quantiles of the simulated null distributions are saved for a grid of n and
+alpha. For other n, they are interpolated linearly in log n. Beyond the grid, None is returned and the tests fall
+back to the asymptotic formula.
+"""
+
+import os
+from typing import List, Union
+import numpy as np
+
+# local file imports
+from statistical_tests.null_distribution import simulate_null_statistics
+from statistical_tests.quantile_table_generation import get_alphas
+
+VN_GRID_DIRECTORY = 'quantile_tables'
+DEFAULT_N_VALUES = [3, 4, 5, 7, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000]
+
+
+class VnQuantileGrid:
+    """quantiles[i, j] is the (1 - alphas[j]) quantile of the statistic for vectors of length n_values[i]."""
+    def __init__(self, test_name: str, n_values: np.array, alphas: np.array, quantiles: np.array):
+        self.test_name = test_name
+        self.n_values = np.asarray(n_values, dtype=np.int64)
+        self.alphas = np.asarray(alphas, dtype=np.float64)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    @staticmethod
+    def get_filename(test_name: str) -> str:
+        return os.path.join(VN_GRID_DIRECTORY, test_name.strip() + " grid.npz")
+
+    def get_critical_value(self, alpha: float, n: int) -> Union[float, None]:
+        """Returns None if n or alpha is beyond the grid."""
+        if not self.n_values[0] <= n <= self.n_values[-1] or not self.alphas[0] <= alpha <= self.alphas[-1]:
+            return None
+
+        # interpolate in alpha for all n of the grid, then in log n
+        critical_values = [np.interp(alpha, self.alphas, row) for row in self.quantiles]
+        return float(np.interp(np.log(n), np.log(self.n_values), critical_values))
+
+    def save(self) -> None:
+        """Writes to a temporary file first, so other processes never read a partially written file."""
+        filename = self.get_filename(self.test_name)
+        os.makedirs(VN_GRID_DIRECTORY, exist_ok=True)
+        temporary_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filename, 'wb') as file:
+            np.savez(file, n_values=self.n_values, alphas=self.alphas, quantiles=self.quantiles)
+        os.replace(temporary_filename, filename)
+
+    @staticmethod
+    def load(test_name: str) -> Union['VnQuantileGrid', None]:
+        """Return None if there is no such file."""
+        filename = VnQuantileGrid.get_filename(test_name)
+        if not os.path.isfile(filename):
+            return None
+        with np.load(filename) as data:
+            return VnQuantileGrid(test_name, data['n_values'], data['alphas'], data['quantiles'])
+
+
+_grids = {}  # in-process cache: test name -> VnQuantileGrid or None
+
+
+def get_vn_quantile_grid(test_name: str) -> Union[VnQuantileGrid, None]:
+    """Returns the saved grid of the given test, which is loaded only once. Returns None if there is none."""
+    if test_name not in _grids:
+        _grids[test_name] = VnQuantileGrid.load(test_name)
+    return _grids[test_name]
+
+
+def get_vn_critical_value(test_name: str, alpha: float, n: int) -> Union[float, None]:
+    """Returns None if there is no grid or n or alpha is beyond it."""
+    grid = get_vn_quantile_grid(test_name)
+    if grid is None:
+        return None
+    return grid.get_critical_value(alpha, n)
+
+
+def generate_vn_quantile_grids(test_classes: List[type],
+                               n_values: List[int] = None,
+                               number_of_samples: int = 10 ** 5,
+                               resolution: int = 1000,
+                               printing: bool = True
+                               ) -> None:
+    """Simulates the null distributions of all given tests at once for each n and saves their quantiles
+    for all alphas of get_alphas(resolution).
+
+    Example:
+        >>> generate_vn_quantile_grids([VnTest, VnTestOneSided])
+    """
+    if n_values is None:
+        n_values = DEFAULT_N_VALUES
+    alphas = np.array(get_alphas(resolution))
+    quantiles = {}
+
+    for n in n_values:
+        for name, statistics in simulate_null_statistics(test_classes, n, number_of_samples).items():
+            quantiles.setdefault(name, []).append(np.quantile(statistics, 1 - alphas))
+        if printing:
+            print("n=" + str(n) + " finished")
+
+    for name, rows in quantiles.items():
+        grid = VnQuantileGrid(name, n_values, alphas, np.array(rows))
+        grid.save()
+        _grids[name] = grid
@@ -5,6 +5,7 @@ from typing import Callable
 
 # local file imports
 from statistical_tests.statistical_test import StatisticalTest
+from statistical_tests.vn_quantile_grid import get_vn_critical_value
 
 
 class VnTest(StatisticalTest):
@@ -13,26 +14,28 @@ class VnTest(StatisticalTest):
 
     def get_statistic(self) -> float:
         """ See equation (2.8) in master_thesis.pdf """
-        ks_statistic = self.uep_abs()
-
-        def f(t: float) -> float:
-            if t <= 0.0 or t >= 1.0:
-                return 0.0  # avoid division by zero
-            return ks_statistic(t) / sqrt(t * (1 - t))
-
-        argmax, max_value = self._get_max_of_almost_piecewise_linear_function(f)
-        return max_value
+        return self._get_weighted_uep_abs_max()[1]
 
     def get_cdf(self, max_iter: int) -> Callable[[float], float]:
         raise ValueError("The Vn test has no distribution function!")
 
+    def get_critical_value_n(self, n: int) -> int:
+        return n
+
+    def get_critical_value_method(self) -> str:
+        return "simulated grid v1, asymptotic v1"
+
     def get_critical_value(self, alpha: float, n: int = -1, epsilon: float = 0.0001, max_iter: int = 100) -> float:
         """
         Arguments epsilon and max_iter are ignored here.
-        See equation (2.10) in master_thesis.pdf
+        Returns the simulated critical value for data of length n, see vn_quantile_grid.py.
+        Beyond the simulated grid, the asymptotic critical value of equation (2.10) in master_thesis.pdf is returned.
         """
         if n == -1:
             n = self.n
+        critical_value = get_vn_critical_value(self.get_name(), alpha, n)
+        if critical_value is not None:
+            return critical_value
         if n < 3:
             raise ValueError("n should be > 2")
 
@@ -1,5 +1,12 @@
 # Copyright 2020 by Willi Sontopski. All rights reserved.
 
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from math import erf, sqrt, pi, exp
 from typing import Callable
@@ -7,11 +14,51 @@ import numpy as np
 
 # local file imports
 from simulation.piecewise_linear_function import PiecewiseLinearFunction
-from simulation.statistic_tools import get_cdf_uniform_with_eps_error
+from simulation.statistic_tools import get_cdf_uniform_with_eps_error, get_sorted_random_values
+from simulation import statistic_tools
 from statistical_tests.ln_test import LnTest
+from statistical_tests.ks_test import KsTest
+from statistical_tests.data_loader import load_binary, load_data, load_npy, load_text
+from statistical_tests.ks_test_onesided import KsTestOneSided
+from statistical_tests.ln_test_onesided import LnTestOneSided
+from statistical_tests.vn_test import VnTest
+from statistical_tests.vn_test_onesided import VnTestOneSided
+from statistical_tests.sorted_sample import SortedSample
+from statistical_tests import null_distribution
+from statistical_tests.batch_testing import evaluate_datasets
+from statistical_tests.quantile_table_generation import generate_quantile_tables
+from statistical_tests import kernels
+from benchmarks.benchmark_suite import find_regressions
+from simulation.instrumentation import Instrumentation, instrumentation
+from simulation.progress import ProgressReporter
+from simulation.monte_carlo import MonteCarloSimulation
+from statistical_tests.critical_value_cache import CriticalValueCache, critical_value_cache
+from statistical_tests import ks_finite_n
+from statistical_tests import vn_quantile_grid
+from statistical_tests.empirical_process import EmpiricalDistributionFunction, UniformEmpiricalProcess
+from server.uniformity_server import UniformityServer, request_evaluation
+from simulation.parallel_simulation import simulate_statistics, get_block_size
+from simulation.importance_sampling import estimate_tail_probabilities, get_tilted_cdfs
+from statistical_tests import cdf_surrogate
+from simulation.work_queue import WorkQueue
+from statistical_tests.sliding_window import SlidingWindow
+
+IMPORT_TIME_FACTOR = 3.0  # importing the statistical tests may take at most that many times as long as numpy
 
 
 class UnitTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # critical values of the tests must not end up in quantile_tables/critical values.csv
+        cls.cache_directory = tempfile.TemporaryDirectory()
+        cls.cache_filename = critical_value_cache.filename
+        critical_value_cache.set_filename(os.path.join(cls.cache_directory.name, 'critical values.csv'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        critical_value_cache.set_filename(cls.cache_filename)
+        cls.cache_directory.cleanup()
+
     def test_affine_linear_function(self):
         points = [[0.3, 0.1], [0.5, 0.11], [0.8, 0.12], [0.9, 0.2]]
         f = PiecewiseLinearFunction(points)
@@ -98,6 +145,578 @@ class UnitTests(unittest.TestCase):
 
         return result
 
+    def test_data_loader(self):
+        data = np.random.uniform(size=1000)
+        with tempfile.TemporaryDirectory() as directory:
+            data.tofile(os.path.join(directory, 'data.f64'))
+            data.astype(np.float32).tofile(os.path.join(directory, 'data.f32'))
+            np.save(os.path.join(directory, 'data.npy'), data)
+            with open(os.path.join(directory, 'data.csv'), 'w') as file:
+                file.write('index;value\n')
+                for i, x in enumerate(data):
+                    file.write(str(i) + ';' + repr(float(x)).replace('.', ',') + '\n')
+
+            np.testing.assert_array_equal(load_binary(os.path.join(directory, 'data.f64')), data)
+            np.testing.assert_array_equal(load_binary(os.path.join(directory, 'data.f32'), dtype=np.float32),
+                                          data.astype(np.float32))
+            np.testing.assert_array_equal(load_npy(os.path.join(directory, 'data.npy')), data)
+            self.assertRaises(TypeError, load_data, os.path.join(directory, 'data.npy'), offset=8)
+            np.testing.assert_array_equal(
+                load_text(os.path.join(directory, 'data.csv'), column=1, separator=';', skip_header=1, chunk_size=64),
+                data)
+
+            expected = KsTest(data_vector=data).get_statistic()
+            test = KsTest.from_file(os.path.join(directory, 'data.npy'), sort_in_place=True)
+            self.assertIs(test.data, test.data_sorted)
+            self.assertEqual(expected, test.get_statistic())
+            np.testing.assert_array_equal(np.load(os.path.join(directory, 'data.npy')), data)  # file is unchanged
+
+    def test_sorted_sample_extrema(self):
+        data = np.random.RandomState(0).uniform(size=(5, 200))
+        data[0, 10:15] = data[0, 20]  # ties
+        matrix_sample = SortedSample(data)
+
+        for row in range(data.shape[0]):
+            test = KsTest(data_vector=data[row])
+            # the old maximizer, which probes the functionals next to the order statistics
+            uep = test._get_max_of_almost_piecewise_linear_function(test.uep())
+            uep_abs = test._get_max_of_almost_piecewise_linear_function(test.uep_abs())
+            expected = {
+                KsTest: uep_abs[1],
+                KsTestOneSided: uep[1],
+                LnTest: uep_abs[1] / sqrt(uep_abs[0] * (1 - uep_abs[0])),
+                LnTestOneSided: uep[1] / sqrt(uep[0] * (1 - uep[0])),
+                VnTest: test._get_max_of_almost_piecewise_linear_function(
+                    lambda t: test.uep_abs()(t) / sqrt(t * (1 - t)) if 0.0 < t < 1.0 else 0.0)[1],
+                VnTestOneSided: test._get_max_of_almost_piecewise_linear_function(
+                    lambda t: test.uep()(t) / sqrt(t * (1 - t)) if 0.0 < t < 1.0 else 0.0)[1]
+            }
+
+            sample = SortedSample(data[row])
+            for test_class, expected_statistic in expected.items():
+                delta = 1e-4 * expected_statistic  # the old maximizer has an error of order epsilon / t
+                test = test_class(data_vector=data[row])
+                self.assertAlmostEqual(expected_statistic, test.get_statistic(), delta=delta)
+                test.sample = sample
+                self.assertAlmostEqual(expected_statistic, test.get_statistic(), delta=delta)
+                test.sample = matrix_sample
+                self.assertAlmostEqual(expected_statistic, test.get_statistic()[row], delta=delta)
+
+    def test_p_value(self):
+        with tempfile.TemporaryDirectory() as directory:
+            null_distribution.NULL_DISTRIBUTION_DIRECTORY = directory
+            try:
+                test = KsTest(data_vector=np.random.uniform(size=50))
+                p_value = test.p_value(number_of_samples=2000)
+                self.assertTrue(os.path.isfile(null_distribution.NullDistribution.get_filename(test.get_name(), 50)))
+                self.assertTrue(0.0 < p_value <= 1.0)
+
+                test.data = np.linspace(0.0, 0.5, 50)  # clearly not uniformly distributed
+                self.assertAlmostEqual(1 / 2001, test.p_value(number_of_samples=2000))
+
+                # the asymptotic critical value is close to the simulated quantile
+                distribution = null_distribution.get_null_distribution(test, 50, number_of_samples=2000)
+                self.assertAlmostEqual(test.get_critical_value(alpha=0.1), distribution.get_quantile(0.9), delta=0.1)
+            finally:
+                null_distribution.NULL_DISTRIBUTION_DIRECTORY = 'null_distributions'
+                null_distribution._null_distributions.clear()
+
+    def test_evaluate_datasets(self):
+        datasets = [np.random.uniform(size=20), np.random.uniform(size=30) ** 2, list(np.random.uniform(size=20))]
+        own_data = np.random.uniform(size=10)
+        tests = [KsTest(data_vector=own_data), LnTestOneSided(), VnTest()]
+        alphas = [0.05, 0.1]
+        result = evaluate_datasets(datasets, tests, alphas, with_p_values=False)
+        self.assertEqual(len(datasets) * len(tests) * len(alphas), result.size)
+        self.assertEqual(KsTest(data_vector=own_data).get_statistic(), tests[0].get_statistic())  # data is kept
+        np.testing.assert_array_equal(own_data, tests[0].data)  # in its original order
+        self.assertEqual(10, tests[0].n)
+
+        for row in result:
+            test = type(tests[[t.get_name() for t in tests].index(row['test'])])(data_vector=datasets[row['dataset']])
+            self.assertEqual(len(datasets[row['dataset']]), row['n'])
+            self.assertAlmostEqual(test.get_statistic(), row['statistic'])
+            self.assertAlmostEqual(test.get_critical_value(alpha=row['alpha'], n=test.get_critical_value_n(row['n'])),
+                                   row['critical_value'])
+            self.assertEqual(test.do_test(alpha=row['alpha'], printing=False), row['dismissed'])
+            self.assertTrue(np.isnan(row['p_value']))
+
+    def test_generate_quantile_tables(self):
+        working_directory = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.mkdir('quantile_tables')
+                generate_quantile_tables([KsTest, LnTestOneSided], resolution=10, epsilon=0.001, max_iter=20,
+                                         processes=2, save_interval=3, printing=False)
+                for test in [KsTest(), LnTestOneSided()]:
+                    self.assertEqual(9, len(test._quantile_table.quantiles))
+                    for q in test._quantile_table.quantiles:
+                        self.assertAlmostEqual(q.alpha, test.get_cdf(20)(q.value), delta=0.001)
+                self.assertEqual([], [f for f in os.listdir('quantile_tables') if f.endswith('.tmp')])
+                for test in [KsTest(), LnTestOneSided()]:  # the main process built the surrogates for the workers
+                    self.assertIn((test.get_name(), 20), cdf_surrogate._surrogates)
+                    self.assertTrue(os.path.isfile(cdf_surrogate.get_filename(test.get_name(), 20)))
+            finally:
+                os.chdir(working_directory)
+                for test in [KsTest(), LnTestOneSided()]:
+                    cdf_surrogate._surrogates.pop((test.get_name(), 20), None)
+
+    def test_import_time(self):
+        """The statistical tests must not import matplotlib, because it is slow and probes the GUI backend."""
+        code = "import sys, time; start = time.perf_counter(); import numpy; middle = time.perf_counter(); " \
+               "import statistical_tests.ks_test; import simulation.monte_carlo; " \
+               "print(middle - start, time.perf_counter() - middle, 'matplotlib' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        # relative to numpy in the same interpreter, so slow machines are no problem
+        self.assertLess(float(output[1]), IMPORT_TIME_FACTOR * float(output[0]))
+        self.assertEqual('False', output[2])
+
+    def test_kernel_backends(self):
+        data = np.random.uniform(size=(20, 100))
+        data[0, :50] = data[0, 50]  # ties
+        x = np.linspace(0.0, 4.0, 50)
+        results = {}
+        previous_backend = kernels.get_backend()
+        try:
+            for backend in kernels.BACKENDS if kernels.NUMBA_AVAILABLE else ['numpy']:
+                kernels.set_backend(backend)
+                sample = SortedSample(data)
+                results[backend] = [sample.get_uep_max(), sample.get_uep_abs_max(), sample.get_weighted_uep_max(),
+                                    sample.get_weighted_uep_abs_max(), SortedSample(data[1]).get_uep_abs_max(),
+                                    kernels.ks_cdf(x, 100), kernels.ln_cdf(x, 100), kernels.ln_cdf(1.5, 100)]
+        finally:
+            kernels.set_backend(previous_backend)
+
+        y = np.concatenate([np.linspace(-7.0, 7.0, 10001), [0.0, 1e-300, np.inf, -np.inf]])
+        np.testing.assert_allclose(kernels._erf(y), [erf(value) for value in y], rtol=0, atol=1e-14)
+
+        for result in results.values():
+            for actual, expected in zip(result, results['numpy']):
+                np.testing.assert_allclose(actual, expected, rtol=1e-12)
+
+    def test_find_regressions(self):
+        baseline = {'a': 1.0, 'b': 1.0, 'c': 1.0}
+        results = {'a': 1.1, 'b': 1.3, 'd': 5.0}
+        self.assertEqual(['b'], find_regressions(results, baseline, threshold=0.2))
+
+    def test_instrumentation(self):
+        instrumentation = Instrumentation()
+        with instrumentation.timer('disabled'):
+            instrumentation.count('disabled')
+        instrumentation.enable(trace=True)
+        for i in range(3):
+            with instrumentation.timer('sorting'):
+                np.sort(np.random.uniform(size=100))
+            instrumentation.count('samples')
+
+        self.assertEqual({'samples': 3}, instrumentation.counters)
+        self.assertEqual(['sorting'], list(instrumentation.timers))
+        self.assertEqual(3, instrumentation.timers['sorting'][0])
+        self.assertEqual(3, len(instrumentation.events))
+        self.assertIn('samples: 3', instrumentation.get_summary())
+
+    def test_progress_reporter(self):
+        states = []
+        progress = ProgressReporter(refresh_interval=0.0, callback=states.append, printing=False)
+        simulation = MonteCarloSimulation(number_of_vectors=10, length_of_vector=20, alpha=0.1)
+        simulation.add_test(KsTest())
+        simulation.add_test(VnTest())
+        simulation.plot_quality_function(epsilon_max=0.1, resolution=20, error_position=0.5, error_delta=0.2,
+                                         progress=progress, print_benchmarks=False, show_plot=False)
+
+        self.assertEqual(200, states[-1]['completed_samples'])
+        self.assertEqual(0.0, states[-1]['eta_seconds'])
+        self.assertTrue(all(fraction == 1.0 for fraction in states[-1]['epsilon_progress'].values()))
+        self.assertEqual({'Kolmogorov Smirnov test', 'Vn test'}, set(states[-1]['rejection_rates']))
+
+        # the parallel engine reports each finished block from the parent process
+        states.clear()
+        simulation.plot_quality_function(epsilon_max=0.1, resolution=20, error_position=0.5, error_delta=0.2,
+                                         progress=progress, processes=2, print_benchmarks=False, show_plot=False)
+        self.assertEqual(200, states[-1]['completed_samples'])
+        self.assertTrue(all(fraction == 1.0 for fraction in states[-1]['epsilon_progress'].values()))
+
+    def test_critical_value_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'critical values.csv')
+            cache = CriticalValueCache(filename=filename, maxsize=2)
+            keys = [CriticalValueCache.get_key('Vn test', 'v1', alpha, 100, 0.0001, 100) for alpha in [0.01, 0.05, 0.1]]
+            for i, key in enumerate(keys):
+                self.assertEqual(float(i), cache.get_or_compute(key, lambda: float(i)))
+            self.assertEqual(2, len(cache._memo))  # least recently used value was removed from memory ...
+            self.assertEqual(0.0, cache.get(keys[0]))  # ... but not from disk
+
+            other_process = CriticalValueCache(filename=filename)
+            self.assertEqual(2.0, other_process.get_or_compute(keys[2], lambda: self.fail("was not cached")))
+            # values of another method are not used
+            self.assertIsNone(cache.get(CriticalValueCache.get_key('Vn test', 'v2', 0.1, 100, 0.0001, 100)))
+
+            # entries of files without a method are dropped
+            with open(filename, 'w') as file:
+                file.write('test;alpha;n;epsilon;max_iter;value\nVn test;0.1;100;0.0001;100;5.0\n')
+            self.assertIsNone(CriticalValueCache(filename=filename).get(keys[2]))
+
+        test = VnTest(data_vector=np.random.uniform(size=100))
+        self.assertEqual(test.get_critical_value(alpha=0.1), test.get_cached_critical_value(alpha=0.1))
+        self.assertEqual(test.get_critical_value(alpha=0.1, n=100), VnTest().get_cached_critical_value(alpha=0.1, n=100))
+
+    def test_ks_finite_n(self):
+        # tabulated critical values of D_n, see e.g. Miller (1956)
+        for n, alpha, critical_value in [(5, 0.05, 0.56328), (10, 0.05, 0.40925), (20, 0.01, 0.35241)]:
+            self.assertAlmostEqual(critical_value * sqrt(n), KsTest().get_critical_value(alpha=alpha, n=n), delta=1e-3)
+        self.assertLess(KsTest().get_critical_value(alpha=0.1, n=10), KsTest().get_critical_value(alpha=0.1))
+
+        # by default, do_test and the simulations use the asymptotic critical values, finite n is opt-in
+        data = np.random.uniform(size=10)
+        self.assertEqual(KsTest().get_critical_value(alpha=0.1),
+                         KsTest(data_vector=data).get_cached_critical_value(alpha=0.1))
+        self.assertEqual(-1, KsTest().get_critical_value_n(10))
+        self.assertEqual(10, KsTest(finite_n=True).get_critical_value_n(10))
+        self.assertEqual(KsTest().get_critical_value(alpha=0.1, n=10),
+                         KsTest(data_vector=data, finite_n=True).get_cached_critical_value(alpha=0.1))
+
+        # the correction of Stephens continues the exact distribution function
+        n = ks_finite_n.EXACT_N_MAX
+        exact = ks_finite_n.get_finite_n_cdf(n)
+        corrected = ks_finite_n.get_finite_n_cdf(n + 1)
+        x = np.array([1.1, 1.2, 1.5, 1.8])  # the upper tail, which contains the critical values
+        np.testing.assert_allclose(exact(x), corrected(x), atol=2e-3)
+
+    def test_ks_onesided_finite_n(self):
+        # tabulated critical values of D_n^+, see e.g. Miller (1956)
+        for n, alpha, critical_value in [(5, 0.05, 0.50945), (10, 0.05, 0.36866), (20, 0.01, 0.32866)]:
+            self.assertAlmostEqual(critical_value * sqrt(n),
+                                   KsTestOneSided().get_critical_value(alpha=alpha, n=n, epsilon=1e-6), delta=1e-3)
+        self.assertEqual(KsTestOneSided().get_critical_value(alpha=0.05),
+                         KsTestOneSided(data_vector=np.random.uniform(size=5)).get_cached_critical_value(alpha=0.05))
+
+        # for large n, the exact distribution function approaches the asymptotic one
+        x = np.array([0.0, 0.5, 1.0, 1.5])
+        asymptotic = KsTestOneSided().get_cdf(100)
+        exact = KsTestOneSided().get_cdf(100, n=10 ** 5)
+        np.testing.assert_allclose(exact(x), [asymptotic(y) for y in x], atol=2e-3)
+        self.assertEqual([exact(y) for y in x], list(exact(x)))  # vectorized evaluation
+
+    def test_vn_quantile_grid(self):
+        name = VnTest().get_name()
+        with tempfile.TemporaryDirectory() as directory:
+            vn_quantile_grid.VN_GRID_DIRECTORY = directory
+            try:
+                vn_quantile_grid.generate_vn_quantile_grids([VnTest], n_values=[10, 40], number_of_samples=2000,
+                                                            resolution=10, printing=False)
+                grid = vn_quantile_grid.VnQuantileGrid.load(name)
+                self.assertEqual(grid.quantiles[0, 0], grid.get_critical_value(alpha=0.1, n=10))
+                # n = 20 lies in the middle of 10 and 40 in log scale
+                self.assertAlmostEqual(grid.quantiles[:, 2].mean(), grid.get_critical_value(alpha=0.3, n=20))
+                self.assertIsNone(grid.get_critical_value(alpha=0.1, n=41))
+                self.assertIsNone(grid.get_critical_value(alpha=0.05, n=20))
+
+                self.assertEqual(grid.get_critical_value(alpha=0.1, n=20), VnTest().get_critical_value(alpha=0.1, n=20))
+                self.assertNotEqual(grid.get_critical_value(alpha=0.1, n=40), VnTest().get_critical_value(0.1, n=41))
+
+                # the interpolated critical values have the right level for freshly simulated statistics
+                for n in [10, 20, 40]:
+                    statistics = null_distribution.simulate_null_statistics([VnTest], n, 10 ** 4)[name]
+                    for alpha in [0.1, 0.3, 0.5, 0.7, 0.9]:
+                        level = np.mean(statistics > grid.get_critical_value(alpha=alpha, n=n))
+                        self.assertAlmostEqual(alpha, level, delta=0.05)
+            finally:
+                vn_quantile_grid.VN_GRID_DIRECTORY = 'quantile_tables'
+                vn_quantile_grid._grids.pop(name, None)
+
+    def test_empirical_process(self):
+        data = np.concatenate((np.random.uniform(size=30), [0.5, 0.5]))  # with ties
+        x = np.random.uniform(size=100)
+        ecdf = EmpiricalDistributionFunction(data)
+        uep = UniformEmpiricalProcess(data, absolute=True)
+        expected = [np.sum(data <= t) / data.size for t in x]
+        np.testing.assert_allclose(expected, ecdf(x))
+        np.testing.assert_allclose([abs(sqrt(data.size) * (e - t)) for e, t in zip(expected, x)], uep(x))
+        self.assertEqual(uep(0.3), uep(np.array([0.3]))[0])
+
+        # the breakpoints give the exact graph
+        for function in [ecdf, uep, UniformEmpiricalProcess(data)]:
+            x_break, y_break = function.get_breakpoints(0.1, 0.9)
+            self.assertEqual((0.1, 0.9), (x_break[0], x_break[-1]))
+            points = np.random.uniform(0.1, 0.9, size=1000)
+            np.testing.assert_allclose(function(points), np.interp(points, x_break, y_break), atol=1e-12)
+
+    def test_uniformity_server(self):
+        server = UniformityServer(host='127.0.0.1', port=0, processes=1, batch_delay=0.2)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start())
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            datasets = [np.random.uniform(size=30) for _ in range(3)]
+            answers = [None] * len(datasets)
+
+            def send(i: int) -> None:
+                answers[i] = request_evaluation(datasets[i], tests=['KsTest', 'VnTest'], alphas=[0.05, 0.1],
+                                                with_p_values=False, port=server.port)
+            clients = [threading.Thread(target=send, args=(i,)) for i in range(len(datasets))]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+
+            expected = evaluate_datasets(datasets, [KsTest(), VnTest()], [0.05, 0.1], with_p_values=False)
+            for i, answer in enumerate(answers):
+                rows = expected[expected['dataset'] == i]
+                self.assertEqual(len(rows), len(answer))
+                for row, result in zip(rows, answer):
+                    self.assertEqual((row['test'], row['alpha'], 30), (result['test'], result['alpha'], result['n']))
+                    self.assertAlmostEqual(row['statistic'], result['statistic'])
+                    self.assertAlmostEqual(row['critical_value'], result['critical_value'])
+                    self.assertIsNone(result['p_value'])
+
+            with self.assertRaises(ValueError):
+                request_evaluation(datasets[0], tests=['NoTest'], port=server.port)
+            with self.assertRaises(ValueError):
+                request_evaluation(datasets[0], alphas=[1.5], port=server.port)
+
+            # a data set which is too short for the Vn test fails only its own request of the batch
+            datasets.append(np.random.uniform(size=2))
+            answers = [None] * len(datasets)
+
+            def send_to_vn_test(i: int) -> None:
+                try:
+                    answers[i] = request_evaluation(datasets[i], tests=['VnTest'], with_p_values=False,
+                                                    port=server.port)
+                except ValueError as e:
+                    answers[i] = e
+            clients = [threading.Thread(target=send_to_vn_test, args=(i,)) for i in range(len(datasets))]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            self.assertTrue(all(isinstance(answer, list) for answer in answers[:-1]))
+            self.assertIsInstance(answers[-1], ValueError)
+
+            async def fail(key, data):
+                raise RuntimeError("worker crashed")
+            server._batcher.submit = fail
+            with self.assertRaisesRegex(ValueError, "RuntimeError: worker crashed"):  # 500 Internal Server Error
+                request_evaluation(datasets[0], port=server.port)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.run_until_complete(server.stop())
+            loop.close()
+
+    def test_parallel_simulation(self):
+        cdfs = [get_cdf_uniform_with_eps_error(epsilon=epsilon, error_position=0.5, delta=0.1) for epsilon in [0, 0.05]]
+        shared_memory_before = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+        parallel = simulate_statistics([KsTest, VnTest], cdfs, n=50, m=2500, processes=2, block_size=1000, seed=1)
+        serial = simulate_statistics([KsTest, VnTest], cdfs, n=50, m=2500, processes=1, block_size=1000, seed=1)
+        np.testing.assert_array_equal(serial, parallel)  # independent of the number of processes
+        self.assertEqual((2, 2, 2500), parallel.shape)
+        if os.path.isdir('/dev/shm'):
+            self.assertEqual(shared_memory_before, set(os.listdir('/dev/shm')))  # all shared memory was freed
+
+        critical_value = KsTest().get_critical_value(alpha=0.1, n=50)
+        self.assertAlmostEqual(0.1, np.mean(serial[0, 0] > critical_value), delta=0.03)
+        self.assertGreater(np.mean(serial[1, 0] > critical_value), np.mean(serial[0, 0] > critical_value))
+
+    def test_memory_bounded_simulation(self):
+        self.assertEqual(10, get_block_size(n=10 ** 4, m=10, memory_budget=2 ** 30))
+        self.assertEqual(1, get_block_size(n=10 ** 4, m=10, memory_budget=0))
+        block_size = get_block_size(n=10 ** 4, m=10 ** 6, processes=4, memory_budget=2 ** 30)
+        self.assertLessEqual(4 * block_size * 10 ** 4 * 8, 2 ** 30)
+        self.assertGreater(get_block_size(n=100, m=10 ** 6, dtype='float32'), get_block_size(n=100, m=10 ** 6))
+
+        cdfs = [get_cdf_uniform_with_eps_error(epsilon=0.0, error_position=0.5, delta=0.1)]
+        instrumentation.enable()
+        try:
+            statistics = simulate_statistics([KsTest], cdfs, n=100, m=3000, processes=1, dtype='float32',
+                                             memory_budget=2 ** 20, seed=2)
+            self.assertGreater(instrumentation.maxima['peak memory [bytes]'], statistics.nbytes)
+            self.assertLess(instrumentation.maxima['block size'], 3000)
+        finally:
+            instrumentation.disable()
+            instrumentation.reset()
+        self.assertEqual(np.float32, statistics.dtype)
+        sample = SortedSample(np.random.uniform(size=(3, 50)).astype(np.float32))
+        sample.get_weighted_uep_abs_max()
+        self.assertEqual(np.float32, sample._get_uep_at_order_statistics()[0].dtype)  # no float64 intermediates
+        self.assertEqual(np.float32, sample._get_weights().dtype)
+        critical_value = KsTest().get_critical_value(alpha=0.1, n=100)
+        self.assertAlmostEqual(0.1, np.mean(statistics[0, 0] > critical_value), delta=0.03)
+
+    def test_importance_sampling(self):
+        n, alpha = 30, 0.001
+        critical_value = KsTest().get_critical_value(alpha=alpha, n=n, epsilon=1e-7)  # exact, see ks_finite_n.py
+        estimate = estimate_tail_probabilities([KsTest], [critical_value], n, m=5000,
+                                               proposals=get_tilted_cdfs(n, alpha), seed=0)[KsTest().get_name()]
+        self.assertLess(estimate.relative_error, 0.1)  # plain Monte Carlo needs about 10 ** 5 vectors for that
+        self.assertAlmostEqual(alpha, estimate.probability, delta=4 * estimate.relative_error * estimate.probability)
+
+        simulation = MonteCarloSimulation(number_of_vectors=5000, length_of_vector=n, alpha=alpha)
+        simulation.add_test(KsTest(finite_n=True))
+        estimate = simulation.estimate_critical_values(seed=1)[KsTest().get_name()]
+        self.assertAlmostEqual(critical_value, estimate.critical_value, delta=0.05)
+        level = simulation.estimate_rejection_probabilities(seed=2)[KsTest().get_name()]
+        self.assertAlmostEqual(alpha, level.probability, delta=4 * level.relative_error * level.probability)
+
+    def test_cdf_surrogate(self):
+        x = np.linspace(-1.0, 8.0, 5000)
+        for test in [KsTest(), LnTest(), KsTestOneSided(), LnTestOneSided()]:
+            reference = np.array([test.get_cdf(100)(t) for t in x])
+            surrogate = test.get_fast_cdf(100)
+            self.assertLessEqual(surrogate.max_error, cdf_surrogate.DEFAULT_TOLERANCE)
+            self.assertLess(np.max(np.abs(surrogate(x) - reference)), cdf_surrogate.DEFAULT_TOLERANCE)
+            h = 1e-5
+            self.assertAlmostEqual((test.get_cdf(100)(1.2 + h) - test.get_cdf(100)(1.2 - h)) / (2 * h),
+                                   surrogate.density(1.2), places=6)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cdf_surrogate.SURROGATE_DIRECTORY = directory
+            try:
+                built = cdf_surrogate.get_cdf_surrogate(KsTest(), max_iter=20, tolerance=1e-8)
+                loaded = cdf_surrogate.ChebyshevSurrogate.load(cdf_surrogate.get_filename(KsTest().get_name(), 20))
+                np.testing.assert_array_equal(built(x), loaded(x))
+                self.assertEqual(built.max_error, loaded.max_error)
+                previous_version = cdf_surrogate.SURROGATE_VERSION
+                cdf_surrogate.SURROGATE_VERSION += 1  # e.g. after a change of the build algorithm
+                try:
+                    self.assertIsNone(cdf_surrogate.ChebyshevSurrogate.load(
+                        cdf_surrogate.get_filename(KsTest().get_name(), 20)))
+                finally:
+                    cdf_surrogate.SURROGATE_VERSION = previous_version
+            finally:
+                cdf_surrogate.SURROGATE_DIRECTORY = 'quantile_tables'
+                cdf_surrogate._surrogates.pop((KsTest().get_name(), 20), None)
+
+        # with few iterations, the series cannot be approximated, so the quantiles use the series itself
+        for test, max_iter, quantile in [(KsTest(), 1, 0.7515), (LnTest(), 2, 1.2952), (LnTest(), 5, 1.8658)]:
+            self.assertRaises(ValueError, test.get_fast_cdf, max_iter)
+            self.assertAlmostEqual(quantile, test.get_quantile(0.3755, 1e-4, max_iter=max_iter, save=False), places=4)
+
+    def test_work_queue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            queue = WorkQueue(directory, lease_timeout=5.0)
+            queue.create_sweep([KsTest, LnTest], n_values=[20], epsilons=[0.0, 0.3], m=600, alpha=0.05,
+                               error_position=0.5, error_delta=0.5, block_size=100, seed=0)
+            self.assertRaises(ValueError, queue.create_sweep, [KsTest], [20], [0.0], 100, 0.05, 0.5)
+
+            dead = queue.claim()  # a worker which dies without heartbeat
+            claimed = os.path.join(queue.claimed_directory, queue.get_task_filename(dead['index']))
+            self.assertEqual(0, queue.reclaim_expired())
+            os.utime(claimed, (time.time() - 10, time.time() - 10))
+            self.assertEqual(1, queue.reclaim_expired())
+            self.assertRaises(ValueError, queue.get_rejection_rates)
+
+            worker = subprocess.Popen([sys.executable, '-m', 'simulation.work_queue', directory, '--poll-interval',
+                                       '0.1'], stdout=subprocess.DEVNULL)
+            completed = queue.work(poll_interval=0.1)
+            worker.wait(timeout=60)
+            self.assertEqual(0, worker.returncode)
+            self.assertTrue(queue.is_finished())
+            self.assertEqual(12, queue.get_number_of_results())
+            self.assertLessEqual(completed, 12)
+            rates = queue.get_rejection_rates()[20]
+
+            task = WorkQueue(directory).run_task(dead)  # done again by a slow worker: the same result
+            with open(os.path.join(queue.results_directory, queue.get_task_filename(dead['index']))) as file:
+                self.assertIn('"rejections": ' + str(task), file.read())
+
+            self.assertAlmostEqual(0.05, rates[0.0][KsTest().get_name()], delta=0.04)
+            self.assertGreater(rates[0.3][KsTest().get_name()], 0.5)
+
+            # a simulation resumes the sweep only if it has the same parameters
+            simulation = MonteCarloSimulation(number_of_vectors=600, length_of_vector=20, alpha=0.05)
+            simulation.add_test(KsTest())
+            simulation.add_test(LnTest())
+            arguments = dict(epsilon_max=0.3, resolution=2, error_position=0.5, error_delta=0.5, work=False)
+            self.assertEqual(rates, simulation.run_on_work_queue(directory, **arguments))
+            simulation.m = 500
+            self.assertRaisesRegex(ValueError, "other m", simulation.run_on_work_queue, directory, **arguments)
+
+    def test_sliding_window(self):
+        stream = np.random.uniform(size=500)
+        stream[100:110] = stream[50]  # ties
+        tests = [KsTest(), KsTestOneSided(), VnTest()]
+        window = SlidingWindow(window_size=200, tests=tests)
+        self.assertRaises(ValueError, window.get_statistics)
+
+        for k, value in enumerate(stream):
+            window.push(value)
+            if k % 37 == 36 or k == stream.size - 1:
+                data = stream[max(0, k - 199):k + 1]
+                np.testing.assert_array_equal(np.sort(data), window.data_sorted)
+                for test_class in [KsTest, KsTestOneSided, VnTest]:
+                    expected = test_class(data_vector=data)
+                    self.assertEqual(expected.get_statistic(), window.get_statistics()[expected.get_name()])
+                    self.assertEqual(expected.do_test(0.05, printing=False),
+                                     window.do_tests(0.05)[expected.get_name()])
+        self.assertTrue(window.is_full())
+        self.assertEqual(stream[300], window.evict())
+        self.assertEqual(199, len(window))
+
+    def test_power_curves(self):
+        for processes in [1, 2]:
+            simulation = MonteCarloSimulation(number_of_vectors=200, length_of_vector=30, alpha=0.05)
+            simulation.add_test(KsTest())
+            simulation.add_test(LnTest())
+            self.assertRaises(ValueError, simulation.get_power_curves, [0.05])
+            simulation.plot_quality_function(epsilon_max=0.2, resolution=20, error_position=0.5, error_delta=0.3,
+                                             processes=processes, print_benchmarks=False, show_plot=False)
+
+            curves = simulation.get_power_curves([0.01, 0.05, 0.1])
+            for w_test in simulation.wrapped_tests:
+                name = w_test.test.get_name()
+                for epsilon, rate in w_test.empirical_probability_h0_dismissed.items():
+                    self.assertAlmostEqual(rate, curves[0.05][name][epsilon])
+                    self.assertLessEqual(curves[0.01][name][epsilon], curves[0.05][name][epsilon])
+                    self.assertLessEqual(curves[0.05][name][epsilon], curves[0.1][name][epsilon])
+
+    def test_adaptive_epsilons(self):
+        states = []
+        progress = ProgressReporter(refresh_interval=0.0, callback=states.append, printing=False)
+        simulation = MonteCarloSimulation(number_of_vectors=200, length_of_vector=50, alpha=0.05)
+        simulation.add_test(KsTest())
+        simulation.plot_quality_function(epsilon_max=0.4, resolution=5, error_position=0.5, error_delta=0.5,
+                                         sample_budget=200 * 12, progress=progress, print_benchmarks=False,
+                                         show_plot=False)
+
+        epsilons = sorted(simulation.wrapped_tests[0].empirical_probability_h0_dismissed)
+        self.assertGreater(len(epsilons), 5)
+        self.assertLessEqual(len(epsilons), 12)
+        self.assertEqual(200 * len(epsilons), states[-1]['completed_samples'])
+        self.assertEqual(states[-1]['total_samples'], states[-1]['completed_samples'])
+        # the power is flat at epsilon = 0.3 and 0.4, so that interval is not split
+        self.assertFalse(any(0.31 < epsilon < 0.39 for epsilon in epsilons))
+        self.assertRaises(ValueError, simulation.plot_quality_function, resolution=13, sample_budget=200 * 12,
+                          show_plot=False)
+
+    def test_sorted_random_values(self):
+        cdf = get_cdf_uniform_with_eps_error(epsilon=0.05, error_position=0.5, delta=0.1)
+        previous_sort_free_min_n = statistic_tools.SORT_FREE_MIN_N
+        for sort_free_min_n in [previous_sort_free_min_n, 0]:  # with and without exponential spacings
+            statistic_tools.SORT_FREE_MIN_N = sort_free_min_n
+            try:
+                uniform = statistic_tools.get_sorted_uniform_values(50, rows=4000, rng=np.random.default_rng(0))
+                values = get_sorted_random_values(cdf, size=50, rows=10, rng=np.random.default_rng(1))
+                single = statistic_tools.get_sorted_uniform_values(1000, out=np.empty(1000, dtype=np.float32))
+            finally:
+                statistic_tools.SORT_FREE_MIN_N = previous_sort_free_min_n
+            for data in [uniform, values, single]:
+                self.assertTrue(np.all(np.diff(data, axis=-1) >= 0))
+                self.assertTrue(np.all((0 < data) & (data < 1)))
+            self.assertEqual(np.float32, single.dtype)
+            # E[U_(i)] = i / (n + 1) and the pooled order statistics are uniformly distributed
+            np.testing.assert_allclose(uniform.mean(axis=0), np.arange(1, 51) / 51, atol=0.01)
+            pooled = KsTest(data_vector=uniform[:400].ravel())  # all values of a row are i.i.d. uniform
+            self.assertFalse(pooled.do_test(0.01, printing=False))
+
+        row = values[0]
+        test = KsTest()
+        test.set_data(row, presorted=True)
+        self.assertIs(row, test.data_sorted)
+        self.assertEqual(KsTest(data_vector=row[::-1]).get_statistic(), test.get_statistic())
+
 
 if __name__ == '__main__':
     unittest.main()